@@ -1,36 +1,106 @@
+import os
+import json
+import time
+import traceback
+import numpy as np
 import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import key_encoding
+import detail_export
+from ip_address import PackedAddresses
+from perf_metrics import peak_rss_mb
+
+CISA_FILE_PATH = 'cisa_file_path.csv'
 
 class AssetAnalyzer:
-    def __init__(self, input_file_path, output_file_path, categories):
+    def __init__(self, input_file_path, output_file_path, categories, cisa_df=None,
+                 export_profile='full', detail_sheets=None, detail_format='xlsx'):
+        """
+        :param export_profile: 'summary', 'selected' or 'full' (see detail_export.EXPORT_PROFILES).
+        :param detail_sheets: Detail sheet names or patterns exported with the 'selected' profile, e.g. ['ALL_*', '*_cisa_unq'].
+        :param detail_format: 'xlsx' for detail sheets in the workbook, 'csv' for side files.
+        """
+        self.export_profile = export_profile
+        self.detail_sheets = detail_sheets
+        self.detail_format = detail_format
+        self.input_file_path = input_file_path
         self.df = pd.read_csv(input_file_path)
-        self.cisa_df = pd.read_csv('cisa_file_path.csv')
+        # A batch run loads the CISA table once and passes it to every analyzer (read-only).
+        self.cisa_df = cisa_df if cisa_df is not None else pd.read_csv(CISA_FILE_PATH)
         self.categories = categories
         self.output_file_path = output_file_path
         self.summary_data = []
         self.overall_assets = 0
+        # The asset IPs are packed into integers (the text is only restored for the rows that are written),
+        # so the unique-asset counts dedup on the packed keys, not on strings.
+        self.addresses = PackedAddresses.pack_column(self.df, 'AssetIPAddress')
+        self.asset_keys = pd.Series(self.addresses.keys(), index=self.df.index)
+        self.category_counts = None
+        self.sheet_rows = {}
+
+    def unique_assets(self, df):
+        return key_encoding.drop_duplicate_keys(df, self.asset_keys.loc[df.index])
+
+    def group_categories(self):
+        """
+        Partition the rows by category once and compute the counts of every category in one grouped
+        reduction, instead of scanning the whole frame for each category.
+        """
+        category_codes, self.category_names = pd.factorize(self.df['category'])
+        # Row positions sorted by category (stable, so each category keeps the file order); the rows of
+        # category k are order[bounds[k]:bounds[k + 1]], a view on one array.
+        self.category_order = np.argsort(category_codes, kind='stable')
+        self.category_bounds = np.searchsorted(category_codes[self.category_order], np.arange(len(self.category_names) + 1))
+
+        self.exploitable_rows = (self.df['IsExploit'] == True).to_numpy()
+        self.cisa_rows = (self.df['IsCISA'] == True).to_numpy()
+        key_rows = self.cisa_rows & (self.df['ExploitCount'] > 0).to_numpy()
+        # One group per (category, asset): the vulnerable count is the number of groups of a category.
+        per_asset = pd.DataFrame({'exploitable': self.exploitable_rows, 'key': key_rows}).groupby(
+            [category_codes, self.asset_keys.to_numpy()], sort=False).agg({'exploitable': 'any', 'key': 'sum'})
+        self.category_counts = per_asset.groupby(level=0).agg(
+            vulnerable=('key', 'size'), exploitable=('exploitable', 'sum'), key=('key', 'sum'))
+        self.overall_counts = pd.Series({
+            'vulnerable': per_asset.index.get_level_values(1).nunique(),
+            'exploitable': per_asset['exploitable'].groupby(level=1).any().sum(),
+            'key': per_asset['key'].sum(),
+        })
+
+    def category_rows(self, category_name=None):
+        """row positions of a category, or of every row for the overall figures"""
+        if category_name is None:
+            return np.arange(len(self.df))
+        code = self.category_names.get_indexer([category_name])[0]
+        if code < 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.category_order[self.category_bounds[code]:self.category_bounds[code + 1]]
+
+    def category_counts_of(self, category_name=None):
+        if category_name is None:
+            return self.overall_counts
+        code = self.category_names.get_indexer([category_name])[0]
+        if code < 0 or code not in self.category_counts.index:
+            return pd.Series({'vulnerable': 0, 'exploitable': 0, 'key': 0})
+        return self.category_counts.loc[code]
 
     def analyze_category(self, cat_dict=None):
+        if self.category_counts is None:
+            self.group_categories()
         if cat_dict:
             category_name = cat_dict['category']
             category_name_s = cat_dict['shortname']
             total_assets = cat_dict['count']
             self.overall_assets += total_assets
-            filtered_df = self.df[self.df['category'] == category_name]
+            rows = self.category_rows(category_name)
+            counts = self.category_counts_of(category_name)
         else:
             category_name = 'Overall'
             category_name_s = 'ALL'
-            filtered_df = self.df
+            rows = self.category_rows()
+            counts = self.category_counts_of()
             total_assets = self.overall_assets
 
-        df_olderthan_45 = filtered_df
-        df_unique_olderthan_45 = df_olderthan_45.drop_duplicates(subset='AssetIPAddress')
-
-        exploitable_assetsdf_olderthan_45 = df_olderthan_45[df_olderthan_45['IsExploit'] == True]
-        unique_exploitable_assetsdf_olderthan_45 = exploitable_assetsdf_olderthan_45.drop_duplicates(subset='AssetIPAddress')
-
-        cisa_df_olderthan_45 = df_olderthan_45[df_olderthan_45['IsCISA'] == True]
-        unique_cisa_df_olderthan_45 = cisa_df_olderthan_45[cisa_df_olderthan_45['ExploitCount'] > 0]
-
         summary_data = {
             'Summary Description': [
                 'Category',
@@ -46,29 +116,34 @@ class AssetAnalyzer:
             'Summary Values': [
                 category_name,
                 total_assets,
-                len(df_unique_olderthan_45),
-                len(unique_exploitable_assetsdf_olderthan_45),
-                len(unique_cisa_df_olderthan_45),
-                int((len(df_unique_olderthan_45) / total_assets) * 100),
-                int((len(unique_exploitable_assetsdf_olderthan_45) / total_assets) * 100),
-                int((len(unique_cisa_df_olderthan_45) / total_assets) * 100),
+                int(counts['vulnerable']),
+                int(counts['exploitable']),
+                int(counts['key']),
+                int((counts['vulnerable'] / total_assets) * 100),
+                int((counts['exploitable'] / total_assets) * 100),
+                int((counts['key'] / total_assets) * 100),
                 '', ''
             ]
         }
 
         self.summary_data.append(pd.DataFrame(summary_data))
 
+        # Detail sheets as row positions; the frames are only taken from self.df when they are written.
+        asset_keys = self.asset_keys.to_numpy()
+        exploitable_rows = rows[self.exploitable_rows[rows]]
+        cisa_rows = rows[self.cisa_rows[rows]]
         return {
-            f'{category_name_s}_data': df_olderthan_45,
-            f'{category_name_s}_vol': df_unique_olderthan_45,
-            f'{category_name_s}_expl': exploitable_assetsdf_olderthan_45,
-            f'{category_name_s}_expl_unq': unique_exploitable_assetsdf_olderthan_45,
-            f'{category_name_s}_cisa': cisa_df_olderthan_45,
-            f'{category_name_s}_cisa_unq': unique_cisa_df_olderthan_45,
+            f'{category_name_s}_data': rows,
+            f'{category_name_s}_vol': rows[key_encoding.first_occurrence(asset_keys[rows])],
+            f'{category_name_s}_expl': exploitable_rows,
+            f'{category_name_s}_expl_unq': exploitable_rows[key_encoding.first_occurrence(asset_keys[exploitable_rows])],
+            f'{category_name_s}_cisa': cisa_rows,
+            f'{category_name_s}_cisa_unq': cisa_rows[(self.df['ExploitCount'].to_numpy()[cisa_rows] > 0)],
         }
 
     def analyze_all_categories(self):
         all_dataframes = {}
+        self.group_categories()
         for cat_dict in self.categories:
             print(f'processing ...... {str(cat_dict)}')
             dataframes = self.analyze_category(cat_dict)
@@ -79,11 +154,85 @@ class AssetAnalyzer:
 
         summary_df = pd.concat(self.summary_data, ignore_index=True)
         print(f'saving summary file')
-        with pd.ExcelWriter(self.output_file_path, engine='openpyxl') as writer:
-            for name, df in all_dataframes.items():
-                df.to_excel(writer, sheet_name=name, index=False)
+        sheets = detail_export.select_detail_sheets(all_dataframes, self.export_profile, self.detail_sheets)
+        self.sheet_rows = detail_export.export_workbook(
+            self.output_file_path,
+            summary_sheets={'counts': summary_df},
+            detail_sheets={name: lambda rows=all_dataframes[name]: self.addresses.restore(self.df.take(rows))
+                           for name in sheets},
+            detail_format=self.detail_format)
+
+
+# CISA table of the batch run, set once in every worker process by _init_worker
+_shared_cisa_df = None
+
+
+def _init_worker(cisa_df):
+    global _shared_cisa_df
+    _shared_cisa_df = cisa_df
+
+
+def run_process_set(process_set):
+    """analyze one process set and write its workbook; returns its entry of the run report"""
+    started = time.perf_counter()
+    report = {'input_file_path': process_set.get('input_file_path'),
+              'output_file_path': process_set.get('output_file_path'),
+              'status': 'ok', 'error': None, 'input_rows': None, 'written_rows': None}
+    try:
+        analyzer = AssetAnalyzer(cisa_df=_shared_cisa_df, **process_set)
+        analyzer.analyze_all_categories()
+        report.update(input_rows=len(analyzer.df), written_rows=sum(analyzer.sheet_rows.values()))
+    except Exception:
+        report.update(status='failed', error=traceback.format_exc())
+    report.update(seconds=round(time.perf_counter() - started, 3), worker_pid=os.getpid(), peak_rss_mb=peak_rss_mb())
+    return report
+
+
+def run_process_list(process_list, max_workers=None, report_path='asset_analysis_run_report.json'):
+    """
+    Run every process set of the batch on a pool of worker processes. The CISA table is loaded once
+    and handed to each worker when it starts; every worker writes its workbook as soon as its set is
+    done. A failed set is recorded in the run report and does not stop the others.
+    """
+    started_at = datetime.now()
+    started = time.perf_counter()
+    cisa_df = pd.read_csv(CISA_FILE_PATH)
+    max_workers = max_workers or min(len(process_list), os.cpu_count() or 1)
+
+    reports = [None] * len(process_list)
+    if max_workers <= 1:
+        _init_worker(cisa_df)
+        for number, process_set in enumerate(process_list):
+            reports[number] = run_process_set(process_set)
+            print(f'finished ...... {reports[number]["output_file_path"]} ({reports[number]["status"]})')
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(cisa_df,)) as pool:
+            futures = {pool.submit(run_process_set, process_set): number for number, process_set in enumerate(process_list)}
+            for future in as_completed(futures):
+                number = futures[future]
+                try:
+                    reports[number] = future.result()
+                except Exception:  # the worker process itself died
+                    reports[number] = {'input_file_path': process_list[number].get('input_file_path'),
+                                       'output_file_path': process_list[number].get('output_file_path'),
+                                       'status': 'failed', 'error': traceback.format_exc()}
+                print(f'finished ...... {reports[number]["output_file_path"]} ({reports[number]["status"]})')
 
-            summary_df.to_excel(writer, sheet_name='counts', index=False)
+    run_report = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'seconds': round(time.perf_counter() - started, 3),
+        'workers': max_workers,
+        'cisa_rows': len(cisa_df),
+        'process_sets': len(process_list),
+        'failed': sum(report['status'] != 'ok' for report in reports),
+        'input_rows': sum(report.get('input_rows') or 0 for report in reports),
+        'written_rows': sum(report.get('written_rows') or 0 for report in reports),
+        'jobs': reports,
+    }
+    if report_path:
+        with open(report_path, 'w') as file:
+            json.dump(run_report, file, indent=2)
+    return run_report
 
 
 process_list = [
@@ -96,6 +245,5 @@ process_list = [
      ]}
 ]
 
-for process_set in process_list:
-    analyzer = AssetAnalyzer(**process_set)
-    analyzer.analyze_all_categories()
+if __name__ == "__main__":
+    run_process_list(process_list)
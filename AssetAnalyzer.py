@@ -1,24 +1,60 @@
+import threading
 import pandas as pd
+import key_encoding
+import detail_export
+from ip_address import PackedAddresses
+
+# Detail sheets of the workbook, in sheet order: the step that builds each frame and the sheet it is derived from.
+DETAIL_SHEETS = {
+    'df': (None, None),
+    'df_olderthan_45': ('_filter_older_than_45_days', None),
+    'df_unique_olderthan_45': ('_get_unique_assets_older_than_45_days', 'df_olderthan_45'),
+    'exploitable_assetsdf_olderthan_45': ('_get_exploitable_assets_older_than_45_days', 'df_olderthan_45'),
+    'unique_exploitable_assetsdf_olderthan_45': ('_get_unique_exploitable_assets_older_than_45_days', 'exploitable_assetsdf_olderthan_45'),
+    'cisa_df_olderthan_45': ('_get_cisa_assets_older_than_45_days', 'df_olderthan_45'),
+    'unique_cisa_df_olderthan_45': ('_get_unique_exploitable_cisa_assets_older_than_45_days', 'cisa_df_olderthan_45'),
+}
 
 class AssetAnalyzer:
-    def __init__(self, data_file_path, cisa_file_path, output_file_path, total_assets):
+    def __init__(self, data_file_path, cisa_file_path, output_file_path, total_assets,
+                 export_profile='full', detail_sheets=None, detail_format='xlsx'):
+        """
+        :param export_profile: 'summary', 'selected' or 'full' (see detail_export.EXPORT_PROFILES).
+        :param detail_sheets: Detail sheet names or patterns exported with the 'selected' profile.
+        :param detail_format: 'xlsx' for detail sheets in the workbook, 'csv' for side files.
+        """
         self.df = pd.read_csv(data_file_path)
         self.cisa_df = pd.read_csv(cisa_file_path)
         self.output_file_path = output_file_path
         self.total_assets = total_assets
+        # The summary counts never need the intermediate frames; they are only built for the exported detail sheets.
+        self.export_profile = export_profile
+        self.detail_sheets = detail_sheets
+        self.detail_format = detail_format
+        self.summary_counts = None
+        self.sheet_rows = {}
+        # Side files are written in parallel; the shared frames are built once, under this lock.
+        self._detail_lock = threading.RLock()
+        # The asset IPs are packed into integers (the text column is only restored for the detail sheets),
+        # so the unique-asset steps dedup on the packed keys, not on strings.
+        self.addresses = PackedAddresses.pack_column(self.df, 'AssetIPAddress')
+        self.asset_keys = pd.Series(self.addresses.keys(), index=self.df.index)
+
+    def _unique_assets(self, df):
+        return key_encoding.drop_duplicate_keys(df, self.asset_keys.loc[df.index])
 
     def _filter_older_than_45_days(self):
-        self.df['age_temp'] = self.df['age'].str.replace(' Days', '').astype(int)
-        self.df_olderthan_45 = self.df[self.df['age_temp'] > 45].drop(columns=['age_temp'])
+        age_days = self.df['age'].str.replace(' Days', '').astype(int)
+        self.df_olderthan_45 = self.df[age_days > 45]
 
     def _get_unique_assets_older_than_45_days(self):
-        self.df_unique_olderthan_45 = self.df_olderthan_45.drop_duplicates(subset='AssetIPAddress')
+        self.df_unique_olderthan_45 = self._unique_assets(self.df_olderthan_45)
 
     def _get_exploitable_assets_older_than_45_days(self):
         self.exploitable_assetsdf_olderthan_45 = self.df_olderthan_45[self.df_olderthan_45['ExploitCount'] > 0]
 
     def _get_unique_exploitable_assets_older_than_45_days(self):
-        self.unique_exploitable_assetsdf_olderthan_45 = self.exploitable_assetsdf_olderthan_45.drop_duplicates(subset='AssetIPAddress')
+        self.unique_exploitable_assetsdf_olderthan_45 = self._unique_assets(self.exploitable_assetsdf_olderthan_45)
 
     def _get_cisa_assets_older_than_45_days(self):
         self.df_olderthan_45_filtered = self.df_olderthan_45.dropna(subset=['CISA ID'])
@@ -28,7 +64,43 @@ class AssetAnalyzer:
     def _get_unique_exploitable_cisa_assets_older_than_45_days(self):
         self.unique_cisa_df_olderthan_45 = self.cisa_df_olderthan_45[self.cisa_df_olderthan_45['ExploitCount'] > 0]
 
+    def aggregate_summary_counts(self):
+        """
+        Every count of the summary in one pass over the data, with row masks instead of filtered frames.
+        The CISA merge becomes a semi-join: each row counts as many times as its CISA ID is listed in
+        cisa_df, which is the row count the inner merge produces.
+        """
+        older = (self.df['age'].str.replace(' Days', '').astype(int) > 45).to_numpy()
+        exploitable = older & (self.df['ExploitCount'] > 0).to_numpy()
+        cisa_matches = self.df['CISA ID'].map(self.cisa_df['cisa_id'].value_counts()).fillna(0).to_numpy(dtype=int) * older
+        # Unique assets: one group per asset key (missing IPs form one group, like drop_duplicates).
+        unique_assets = pd.DataFrame({'older': older, 'exploitable': exploitable}).groupby(
+            self.asset_keys.to_numpy(), sort=False).any().sum()
+        self.summary_counts = {
+            'older': int(older.sum()),
+            'unique_older': int(unique_assets['older']),
+            'exploitable': int(exploitable.sum()),
+            'unique_exploitable': int(unique_assets['exploitable']),
+            'cisa': int(cisa_matches.sum()),
+            'unique_cisa': int(cisa_matches[exploitable].sum()),
+        }
+        return self.summary_counts
+
+    def detail_frame(self, name):
+        """frame of a detail sheet, built (with the frames it is derived from) on first use"""
+        step, source = DETAIL_SHEETS[name]
+        with self._detail_lock:
+            if step is None:
+                if self.addresses.column not in self.df.columns:
+                    self.addresses.restore(self.df)
+                return self.df
+            if getattr(self, name, None) is None:
+                self.detail_frame(source or 'df')
+                getattr(self, step)()
+            return getattr(self, name)
+
     def create_summary(self):
+        counts = self.summary_counts or self.aggregate_summary_counts()
         summary_data = {
             'Summary Description': [
                 'Assets older than 45 days',
@@ -47,42 +119,34 @@ class AssetAnalyzer:
                 'Unique CISA assets older than 45 days percentage'
             ],
             'Summary Values': [
-                len(self.df_olderthan_45),
-                len(self.df_unique_olderthan_45),
-                len(self.exploitable_assetsdf_olderthan_45),
-                len(self.unique_exploitable_assetsdf_olderthan_45),
-                len(self.cisa_df_olderthan_45),
-                len(self.unique_cisa_df_olderthan_45),
+                counts['older'],
+                counts['unique_older'],
+                counts['exploitable'],
+                counts['unique_exploitable'],
+                counts['cisa'],
+                counts['unique_cisa'],
                 '',
                 '',
                 self.total_assets,
                 '',
                 '',
-                int((len(self.df_unique_olderthan_45) / self.total_assets) * 100),
-                int((len(self.unique_exploitable_assetsdf_olderthan_45) / self.total_assets) * 100),
-                int((len(self.unique_cisa_df_olderthan_45) / self.total_assets) * 100)
+                int((counts['unique_older'] / self.total_assets) * 100),
+                int((counts['unique_exploitable'] / self.total_assets) * 100),
+                int((counts['unique_cisa'] / self.total_assets) * 100)
             ]
         }
         self.summary_df = pd.DataFrame(summary_data)
 
     def save_summary_workbook(self):
-        with pd.ExcelWriter(self.output_file_path) as writer:
-            self.df.to_excel(writer, sheet_name='df', index=False)
-            self.df_olderthan_45.to_excel(writer, sheet_name='df_olderthan_45', index=False)
-            self.df_unique_olderthan_45.to_excel(writer, sheet_name='df_unique_olderthan_45', index=False)
-            self.exploitable_assetsdf_olderthan_45.to_excel(writer, sheet_name='exploitable_assetsdf_olderthan_45', index=False)
-            self.unique_exploitable_assetsdf_olderthan_45.to_excel(writer, sheet_name='unique_exploitable_assetsdf_olderthan_45', index=False)
-            self.cisa_df_olderthan_45.to_excel(writer, sheet_name='cisa_df_olderthan_45', index=False)
-            self.unique_cisa_df_olderthan_45.to_excel(writer, sheet_name='unique_cisa_df_olderthan_45', index=False)
-            self.summary_df.to_excel(writer, sheet_name='summary_df', index=False)
+        sheets = detail_export.select_detail_sheets(DETAIL_SHEETS, self.export_profile, self.detail_sheets)
+        self.sheet_rows = detail_export.export_workbook(
+            self.output_file_path,
+            summary_sheets={'summary_df': self.summary_df},
+            detail_sheets={name: lambda name=name: self.detail_frame(name) for name in sheets},
+            detail_format=self.detail_format)
 
     def analyze(self):
-        self._filter_older_than_45_days()
-        self._get_unique_assets_older_than_45_days()
-        self._get_exploitable_assets_older_than_45_days()
-        self._get_unique_exploitable_assets_older_than_45_days()
-        self._get_cisa_assets_older_than_45_days()
-        self._get_unique_exploitable_cisa_assets_older_than_45_days()
+        self.aggregate_summary_counts()
         self.create_summary()
         self.save_summary_workbook()
 
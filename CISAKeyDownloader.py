@@ -1,74 +1,137 @@
 import os
+import json
+import hashlib
+import tempfile
 import pandas as pd
 import requests
-import shutil
-from io import StringIO
+from io import BytesIO
+from datetime import datetime
 import traceback
+from kev_index import KevIndex, write_mapped_kev_index
 
 
 class CISAKeyDownloader:
     def __init__(self):
         self.cisa_key_url = 'https://www.cisa.gov/sites/default/files/csv/known_exploited_vulnerabilities.csv'
         self.cisa_key_file_path = os.path.join('static', 'cisa_key.csv')
-        self.backup_path = self.cisa_key_file_path + ".bak"
+        # Parsed catalog saved next to the CSV, so downstream jobs load it without parsing the CSV again.
+        self.cisa_key_index_path = os.path.join('static', 'cisa_key.pkl')
+        # Memory-mapped lookup index (see kev_index.MappedKevIndex), shared by concurrent report jobs.
+        self.cisa_key_mapped_index_path = os.path.join('static', 'cisa_key_index')
+        # Validators (ETag / Last-Modified) and content hash of the last successful download.
+        self.metadata_path = os.path.join('static', 'cisa_key.json')
+
+    @property
+    def cisa_kev_file_path(self):
+        return self.cisa_key_file_path
+
+    def load_metadata(self):
+        """metadata of the last download, or an empty dict when the CSV or one of the indexes is missing"""
+        if not (os.path.exists(self.cisa_key_file_path) and os.path.exists(self.cisa_key_index_path)
+                and os.path.exists(self.cisa_key_mapped_index_path)):
+            return {}
+        try:
+            with open(self.metadata_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def conditional_headers(self, metadata):
+        """If-None-Match / If-Modified-Since headers for a conditional GET"""
+        headers = {}
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+        return headers
 
     def download_and_save(self):
         """Manage the download and verification of the CSV file."""
         try:
-            # Backup existing file
-            if os.path.exists(self.cisa_key_file_path):
-                shutil.copy2(self.cisa_key_file_path, self.backup_path)
-
-            # download the file
-            response = requests.get(self.cisa_key_url)
+            # download the file, unless it has not changed since the last download
+            metadata = self.load_metadata()
+            response = requests.get(self.cisa_key_url, headers=self.conditional_headers(metadata))
+            if response.status_code == 304:
+                self._write_file(self.metadata_path, json.dumps(
+                    dict(metadata, checked_at=datetime.now().isoformat(timespec='seconds')), indent=2).encode('utf-8'))
+                return 1, "File is unchanged since the last download, previous CSV and indexes kept."
             response.raise_for_status()  # Check for HTTP errors
 
-            # Validate the downloaded file
-            pd.read_csv(StringIO(response.text))
-
-            # save the downloaded file
-            with open(self.cisa_key_file_path, 'wb') as file:
-                file.write(response.content)
-
-            # validate cisa key file to confirm valid
-            pd.read_csv(self.cisa_key_file_path)
-
-            # remove backup file
-            if os.path.exists(self.backup_path):
-                os.remove(self.backup_path)
+            # Validate the downloaded bytes (parsed once, the same frame is saved as the index)
+            content = response.content
+            cisa_df = pd.read_csv(BytesIO(content))
+            if cisa_df.empty:
+                raise ValueError("Downloaded CISA KEV file has no rows")
+
+            # save the indexes and the CSV via temp file + rename, the validators last: if the process is
+            # interrupted in between, the old validators force a full download on the next run
+            self._write_file(self.cisa_key_index_path, cisa_df)
+            write_mapped_kev_index(cisa_df, self.cisa_key_mapped_index_path)
+            self._write_file(self.cisa_key_file_path, content)
+            self._write_file(self.metadata_path, json.dumps({
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': hashlib.sha256(content).hexdigest(),
+                'rows': len(cisa_df.index),
+                'downloaded_at': datetime.now().isoformat(timespec='seconds'),
+            }, indent=2).encode('utf-8'))
 
             return 1, "File is downloaded and verified as correct."
 
         except Exception as e:
             print(f'error: {traceback.format_exc()}')
 
-            # restore backup file
-            if os.path.exists(self.backup_path):
-                shutil.copy2(self.backup_path, self.cisa_key_file_path)
-                os.remove(self.backup_path)
-
             # check is cisa key file exists
             if not os.path.exists(self.cisa_key_file_path):
                 return 0, "File did not download, and no existing CSV exists to proceed further."
 
             return 2, "File did not download, but old CSV is intact to use. Check log for details."
 
+    def load_cisa_key(self):
+        """the CISA KEV catalog from the saved index, falling back to parsing the CSV"""
+        if os.path.exists(self.cisa_key_index_path):
+            try:
+                return pd.read_pickle(self.cisa_key_index_path)
+            except Exception:
+                print(f'error: {traceback.format_exc()}')
+        if os.path.exists(self.cisa_key_file_path):
+            return pd.read_csv(self.cisa_key_file_path)
+        return None
+
+    def _write_file(self, file_path, content):
+        # Concurrent jobs can refresh the same files: each one writes its own temp file and swaps it in.
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(file_path), prefix=os.path.basename(file_path) + '.',
+                                         suffix='.tmp', delete=False) as file:
+            temp_path = file.name
+            try:
+                if isinstance(content, pd.DataFrame):
+                    content.to_pickle(file)
+                else:
+                    file.write(content)
+            except Exception:
+                file.close()
+                os.remove(temp_path)
+                raise
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, file_path)
+
     def update_is_cisa_key(self):
         """Compare CVE IDs between the local data file and the CISA key file."""
         try:
             data_file_path = 'datafile.csv'
             data_df = pd.read_csv(data_file_path)
-            cisa_df = pd.read_csv(self.cisa_key_file_path)
+            cisa_df = self.load_cisa_key()
 
-            data_df['Cve Ids'] = data_df['Cve Ids'].str.upper()
-            cisa_df['CveID'] = cisa_df['CveID'].str.upper()
-
-            data_df['IsCisaKey'] = data_df['Cve Ids'].isin(cisa_df['CveID'])
+            # every CVE of a multi-CVE cell is matched, not just cells holding a single CVE
+            data_df['IsCisaKey'] = KevIndex(cisa_df).match(data_df['Cve Ids'])['CisaKev']
             return data_df
         except Exception as e:
             print(f"An error occurred while comparing CVE IDs: {e}")
             return None
 
-downloader = CISAKeyDownloader()
-status_code, message = downloader.download_and_save()
-print(f"Status Code: {status_code}, Message: {message}")
+
+if __name__ == "__main__":
+    downloader = CISAKeyDownloader()
+    status_code, message = downloader.download_and_save()
+    print(f"Status Code: {status_code}, Message: {message}")
@@ -2,6 +2,7 @@ import os
 import pandas as pd
 
 from utilities.CISAKeyDownloader import CISAKeyDownloader
+from kev_index import KevIndex, MappedKevIndex
 
 
 class CisaKeyProcess:
@@ -10,13 +11,25 @@ class CisaKeyProcess:
                  data_file_path: str = None,
                  cisa_kev_df: pd.DataFrame = None,
                  cisa_kev_file_path: str = None,
-                 download_cisa_kev: bool = None):
+                 download_cisa_kev: bool = None,
+                 cisa_kev_index_path: str = None,
+                 kev_index=None,
+                 cve_column: str = 'Vulnerability CVE IDs',
+                 cisa_kev_attributes: list = None):
 
         self.data_df = data_df
         self.data_file_path = data_file_path
         self.cisa_kev_df = cisa_kev_df
         self.cisa_kev_file_path = cisa_kev_file_path
         self.download_cisa_kev = download_cisa_kev
+        # Folder of a memory-mapped KEV index (kev_index.write_mapped_kev_index); used when no catalog
+        # DataFrame is given, so concurrent jobs share one copy of the index instead of parsing the CSV.
+        self.cisa_kev_index_path = cisa_kev_index_path
+        # KevIndex / MappedKevIndex already built by the caller
+        self.kev_index = kev_index
+        self.cve_column = cve_column
+        # KEV columns copied onto matched rows next to CisaKev, e.g. ['dateAdded', 'dueDate', 'knownRansomwareCampaignUse']
+        self.cisa_kev_attributes = cisa_kev_attributes or []
 
 
     def read_file(self, file_path):
@@ -30,35 +43,53 @@ class CisaKeyProcess:
 
     def load_data_df(self):
         """load data if file path is given"""
-        if not self.data_df and self.data_file_path:
+        if self.data_df is None and self.data_file_path:
             self.data_df = self.read_file(self.data_file_path)
 
     def load_cisa_kev(self):
         """load cisa kev data if file path is given"""
-        if not self.cisa_kev_df and self.cisa_kev_file_path:
-            self.data_df = self.read_file(self.cisa_kev_file_path)
+        if self.cisa_kev_df is not None or self.kev_index is not None:
+            return
 
-        elif not self.cisa_kev_df and self.download_cisa_kev:
+        if self.cisa_kev_index_path and os.path.exists(self.cisa_kev_index_path):
+            self.kev_index = MappedKevIndex(self.cisa_kev_index_path)
+
+        elif self.cisa_kev_file_path:
+            self.cisa_kev_df = self.read_file(self.cisa_kev_file_path)
+
+        elif self.download_cisa_kev:
             downloader = CISAKeyDownloader()
             status_code, message = downloader.download_and_save()
-            if status_code > 0:
-                self.cisa_kev_df = self.read_file(downloader.cisa_kev_file_path)
+            if status_code > 0 and os.path.exists(downloader.cisa_key_mapped_index_path):
+                self.kev_index = MappedKevIndex(downloader.cisa_key_mapped_index_path)
+            elif status_code > 0:
+                # parsed catalog saved by the downloader, the CSV is only parsed when it is missing
+                self.cisa_kev_df = downloader.load_cisa_key()
+
+    def load_kev_index(self):
+        """index of the loaded catalog, or None when there is no catalog (or it is empty)"""
+        if self.kev_index is None and isinstance(self.cisa_kev_df, pd.DataFrame) and len(self.cisa_kev_df) > 0:
+            self.kev_index = KevIndex(self.cisa_kev_df)
+        if self.kev_index is not None and len(self.kev_index) > 0:
+            return self.kev_index
+        return None
 
     def update_is_cisa_kev(self):
-        """update cisa kev in data"""
-        if (isinstance(self.data_df, pd.DataFrame) and len(self.data_df) > 0 and
-                isinstance(self.cisa_kev_df, pd.DataFrame) and len(self.cisa_kev_df) > 0):
-            pass
+        """update cisa kev in data: a row is KEV when any CVE of its (multi-CVE) cell is in the catalog"""
+        if isinstance(self.data_df, pd.DataFrame) and len(self.data_df) > 0 and self.load_kev_index() is not None:
+            matches = self.kev_index.match(self.data_df[self.cve_column], self.cisa_kev_attributes)
+            self.data_df = self.data_df.assign(**{column: matches[column] for column in matches.columns})
         return self.data_df
 
     def update_cisa_kev_column_position(self):
         """update column positions"""
-        if (isinstance(self.data_df, pd.DataFrame) and len(self.data_df) > 0 and
-                isinstance(self.cisa_kev_df, pd.DataFrame) and len(self.cisa_kev_df) > 0):
+        if isinstance(self.data_df, pd.DataFrame) and len(self.data_df) > 0 and self.load_kev_index() is not None:
             df_columns = self.data_df.columns.tolist()
             cisa_columns = ['Vulnerability CVSS Score', 'Vulnerability CVSSv3 Severity', 'CisaKev']
+            cisa_columns += [column for column in df_columns if column.startswith('CisaKev ')]
+            cisa_columns = [column for column in cisa_columns if column in df_columns]
 
-            if 'Vulnerability CVSS Score' in df_columns:
+            if 'Vulnerability CVSS Score' in df_columns and 'CisaKev' in df_columns:
                 # find first column
                 cvss_column_position = df_columns.index('Vulnerability CVSS Score')
                 # remove columns
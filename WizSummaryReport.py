@@ -1,15 +1,55 @@
 import os
 import pandas as pd
-from openpyxl import Workbook
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from openpyxl import Workbook, load_workbook
 from utilities.logger_master import logger, log_function_entry_exit
+from perf_metrics import metrics, record_performance
+
+COUNT_SHEETS = ['count', 'counts']
+
+
+def harvest_count_sheet(file_path, row_labels):
+    """
+    Metrics of one '*_count*.xlsx' file, as (sheet name, {row label: value}).
+
+    The workbook is opened read-only and only the 'count' / 'counts' sheet is streamed, row by row. A
+    'counts' sheet holds one block per category; reading stops at the end of the Overall block, and the
+    values are None when the sheet has no Overall block. The sheet name is None when neither sheet exists.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet_name = next((name for name in COUNT_SHEETS if name in workbook.sheetnames), None)
+        if sheet_name is None:
+            return None, None
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        label_column, value_column = header.index('Summary Description'), header.index('Summary Values')
+
+        values = {} if sheet_name == 'count' else None
+        for row in rows:
+            label = row[label_column] if label_column < len(row) else None
+            value = row[value_column] if value_column < len(row) else None
+            if sheet_name == 'counts' and str(label) == 'Category':
+                if values is not None:
+                    break
+                if str(value) == 'Overall':
+                    values = {}
+            elif values is not None and label in row_labels and pd.notna(value):
+                values[label] = int(float(value))
+        return sheet_name, values
+    finally:
+        workbook.close()
 
 
 @log_function_entry_exit(logger)
+@record_performance()
 class WizSummaryReport:
-    def __init__(self, root_folder, output_file_path):
+    def __init__(self, root_folder, output_file_path, max_workers=None):
         logger.info("Initializing WizSummaryReport")
         self.root_folder = root_folder if isinstance(root_folder, list) else [root_folder]
         self.output_file_path = output_file_path
+        # Worker processes reading the count files; by default one per CPU, 1 reads them in this process.
+        self.max_workers = max_workers
         self.metrics = {}
         self.row_val_map = {
             'Total assets': 0,
@@ -25,51 +65,68 @@ class WizSummaryReport:
         }
 
     
-    def extract_metrics(self):
-        logger.info(f'Starting to extract metrics from folder(s): {self.root_folder}')
+    def find_count_files(self):
+        """(category, file path) of every '*_count*.xlsx' file: folder by folder, sorted by path"""
+        count_files = []
         for folder in self.root_folder:
+            folder_files = []
             for subdir, dirs, files in os.walk(folder):
                 for file in files:
                     if file.endswith(".xlsx") and '_count' in file:
-                        category = file.split('_count')[0]
-                        file_path = os.path.join(subdir, file)
-                        logger.info(f'Category: {category}, Processing file: {file_path}')
-                        try:
-                            self._process_excel_file(file_path, category)
-                        except Exception as e:
-                            logger.error(f"Error processing file {file_path}: {e}")
+                        folder_files.append((file.split('_count')[0], os.path.join(subdir, file)))
+            count_files += sorted(folder_files, key=lambda count_file: count_file[1])
+        return count_files
+
+    def extract_metrics(self):
+        logger.info(f'Starting to extract metrics from folder(s): {self.root_folder}')
+        count_files = self.find_count_files()
+        max_workers = self.max_workers or min(len(count_files), os.cpu_count() or 1)
+        if max_workers <= 1:
+            for category, file_path in count_files:
+                logger.info(f'Category: {category}, Processing file: {file_path}')
+                try:
+                    self._process_excel_file(file_path, category)
+                except Exception as e:
+                    logger.error(f"Error processing file {file_path}: {e}")
+            return
+
+        # The files are read in parallel, the results are merged in file order, so when several files
+        # have the same category the last one wins, whichever worker finishes first.
+        results = [None] * len(count_files)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(harvest_count_sheet, file_path, list(self.row_val_map)): number
+                       for number, (category, file_path) in enumerate(count_files)}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+        for (category, file_path), result in zip(count_files, results):
+            logger.info(f'Category: {category}, Processing file: {file_path}')
+            if isinstance(result, Exception):
+                logger.error(f"Error processing file {file_path}: {result}")
+            else:
+                self._merge_file_metrics(file_path, category, *result)
 
     def _process_excel_file(self, file_path, category):
         logger.info(f'Extracting data from file: {file_path}')
-        excel_file = pd.ExcelFile(file_path)
-        sheet_name = ''
-        if 'count' in excel_file.sheet_names:
-            sheet_name = 'count'
-        elif 'counts' in excel_file.sheet_names:
-            sheet_name = 'counts'
-
-        if sheet_name != '':
-            logger.info(f"'{sheet_name}' sheet found in {file_path}")
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            overall_category = False
-            for i, row in df.iterrows():
-                col_a_summary = row['Summary Description']
-                col_b_value = row['Summary Values']
-                if sheet_name == 'count':
-                    if col_a_summary in self.row_val_map and pd.notna(col_b_value):
-                        logger.info(f"Updating {col_a_summary} for category {category} with value {col_b_value}")
-                        self.metrics[category][col_a_summary] = int(float(col_b_value))
-
-                elif sheet_name == 'counts':
-                    if str(col_a_summary) == 'Category' and str(col_b_value) == 'Overall':
-                        overall_category = True
-                        logger.info(f"Found category: {overall_category}")
-                        self.metrics[category] = {key: 0 for key in self.row_val_map}
-                    elif overall_category and col_a_summary in self.row_val_map and pd.notna(col_b_value):
-                        logger.info(f"Updating {col_a_summary} for category {category} with value {col_b_value}")
-                        self.metrics[category][col_a_summary] = int(float(col_b_value))
-        else:
+        self._merge_file_metrics(file_path, category, *harvest_count_sheet(file_path, list(self.row_val_map)))
+
+    def _merge_file_metrics(self, file_path, category, sheet_name, values):
+        if sheet_name is None:
             logger.warning(f"'count' sheet not found in {file_path}")
+            return
+        logger.info(f"'{sheet_name}' sheet found in {file_path}")
+        if values is None:
+            return
+        if sheet_name == 'counts':
+            logger.info("Found category: Overall")
+            self.metrics[category] = {key: 0 for key in self.row_val_map}
+        else:
+            self.metrics.setdefault(category, {key: 0 for key in self.row_val_map})
+        for key, value in values.items():
+            logger.info(f"Updating {key} for category {category} with value {value}")
+            self.metrics[category][key] = value
 
     def create_summary_workbook(self):
         logger.info('Creating summary workbook')
@@ -129,9 +186,15 @@ class WizSummaryReport:
         logger.info("Running WizSummaryReport - END")
 
 
-# update folder path to excel files
-input_folder_path = 'input'
-output_file_path = "output/metrics_summary.xlsx"
-wiz_summary = WizSummaryReport(input_folder_path, output_file_path)
-wiz_summary.run()
+if __name__ == "__main__":
+    # update folder path to excel files
+    input_folder_path = 'input'
+    output_file_path = "output/metrics_summary.xlsx"
+    # per-method timings of the run, for the nightly job dashboards
+    metrics.job = 'wiz_summary'
+    metrics_json_path = "output/metrics_summary_perf.json"
+    metrics_prometheus_path = "output/metrics_summary_perf.prom"
+    wiz_summary = WizSummaryReport(input_folder_path, output_file_path)
+    wiz_summary.run()
+    metrics.write(metrics_json_path, metrics_prometheus_path)
 
@@ -0,0 +1,173 @@
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import importlib.util
+from datetime import datetime
+from importlib.machinery import SourceFileLoader
+
+import pandas as pd
+
+import nexpose_schema
+import synthetic_nexpose_report
+from perf_metrics import peak_rss_mb
+from inventory_files_config import hi_config
+
+DEFAULT_SIZES = [10000, 1000000, 10000000]
+PROCESSOR_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'VulnerabilityReportProcessor')
+
+
+def load_vulnerability_report_processor():
+    """import the VulnerabilityReportProcessor class from its (extension-less) source file"""
+    loader = SourceFileLoader('vulnerability_report_processor', PROCESSOR_FILE_PATH)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module.VulnerabilityReportProcessor
+
+
+class StageTimer:
+    """time, CPU time and memory of every benchmark stage"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def measure(self, stage, func, rows_in=None, rows_out=None):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        result = func()
+        wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+        peak_alloc = None
+        if self.trace_memory:
+            peak_alloc = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+        entry = {
+            'stage': stage,
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu, 4),
+            'peak_alloc_mb': peak_alloc,
+            'peak_rss_mb': None if peak_rss_mb() is None else round(peak_rss_mb(), 1),
+            'rows_in': rows_in,
+            'rows_out': rows_out(result) if callable(rows_out) else rows_out,
+        }
+        self.results.append(entry)
+        print(f"  {stage:<34} {entry['wall_s']:>9.3f}s wall {entry['cpu_s']:>9.3f}s cpu  "
+              f"rows {entry['rows_in']} -> {entry['rows_out']}")
+        return result
+
+
+def run_stages(report_path, kev_path, output_path, trace_memory=False, write_excel=True):
+    """run every processing stage once on a report and return the per-stage measurements"""
+    from hi_report import VulnerabilityReportProcessor as HIReportProcessor
+    VulnerabilityReportProcessor = load_vulnerability_report_processor()
+    timer = StageTimer(trace_memory)
+    kev_df = pd.read_csv(kev_path)
+
+    processor = timer.measure('load', lambda: VulnerabilityReportProcessor(data_file_path=report_path, cisa_kev_df=kev_df),
+                              rows_out=lambda loaded: len(loaded.data.index))
+
+    def stage(name, method):
+        rows_in = len(processor.data.index)
+        timer.measure(name, method, rows_in=rows_in, rows_out=lambda _: len(processor.data.index))
+
+    def apply_filter_plan():
+        processor.data = processor.build_filter_plan().apply(processor.data)
+
+    def fill_missing_text():
+        processor.data = nexpose_schema.fill_missing_text(processor.data)
+
+    # The steps of apply_standard_steps, in its order.
+    stage('filter_plan', apply_filter_plan)
+    stage('merge_severity_scores', processor.merge_severity_scores)
+    stage('add_vulnerability_cvssv3_severity', processor.add_vulnerability_cvssv3_severity)
+    stage('update_is_cisa_kev', processor.update_is_cisa_kev)
+    stage('add_unique_vulnerability_id', processor.add_unique_vulnerability_id)
+    stage('fill_missing_text', fill_missing_text)
+
+    config = dict(hi_config, paths=dict(hi_config['paths'], output_path=output_path))
+    publisher = HIReportProcessor(config=config, download_new_reports=False)
+    rows = len(processor.data.index)
+    sheets = timer.measure('split_dataframe', lambda: publisher.split_dataframe('benchmark.xlsx', processor.data),
+                           rows_in=rows, rows_out=rows)
+    if write_excel:
+        timer.measure('excel_write', lambda: publisher.publish_data_into_excel_file_with_sheets('benchmark.xlsx', sheets),
+                      rows_in=rows, rows_out=rows)
+    return timer.results
+
+
+def compare_results(current, baseline, threshold, min_delta=0.05):
+    """
+    stages that got slower than the baseline by more than `threshold` (0.2 = 20%) and by more than
+    `min_delta` seconds, so timer noise on millisecond stages is not flagged
+    """
+    baseline_times = {(run['rows'], stage['stage']): stage['wall_s'] for run in baseline['runs'] for stage in run['stages']}
+    regressions = []
+    for run in current['runs']:
+        for stage in run['stages']:
+            previous = baseline_times.get((run['rows'], stage['stage']))
+            if previous and stage['wall_s'] > previous * (1 + threshold) and stage['wall_s'] - previous > min_delta:
+                regressions.append({'rows': run['rows'], 'stage': stage['stage'], 'baseline_s': previous,
+                                    'current_s': stage['wall_s'], 'ratio': round(stage['wall_s'] / previous, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage-level benchmark of the Nexpose report processing.')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_SIZES, help='report sizes to benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default='benchmark_data', help='folder for generated reports and workbooks')
+    parser.add_argument('--output', default='benchmark_results.json', help='machine-readable results file')
+    parser.add_argument('--trace-memory', action='store_true', help='record peak Python/numpy allocations per stage (slower)')
+    parser.add_argument('--skip-excel', action='store_true', help='do not benchmark the Excel write')
+    parser.add_argument('--compare', help='results file of a previous run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before a stage is flagged')
+    parser.add_argument('--min-delta', type=float, default=0.05,
+                        help='slowdowns of fewer seconds than this are never flagged')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    kev_path = os.path.join(args.workdir, f'cisa_kev_{args.seed}.csv')
+    if not os.path.exists(kev_path):
+        synthetic_nexpose_report.write_cisa_kev(kev_path, seed=args.seed)
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'runs': [],
+    }
+    for rows in args.rows:
+        report_path = os.path.join(args.workdir, f'nexpose_{rows}_{args.seed}.csv')
+        if not os.path.exists(report_path):
+            print(f"Generating synthetic report with {rows:,} rows...")
+            synthetic_nexpose_report.write_report(report_path, rows, seed=args.seed)
+        print(f"Benchmarking {report_path}:")
+        stages = run_stages(report_path, kev_path, args.workdir, trace_memory=args.trace_memory,
+                            write_excel=not args.skip_excel)
+        results['runs'].append({'rows': rows, 'report_path': report_path, 'stages': stages})
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            regressions = compare_results(results, json.load(file), args.threshold, args.min_delta)
+        for regression in regressions:
+            print(f"REGRESSION: {regression['stage']} at {regression['rows']:,} rows: "
+                  f"{regression['baseline_s']}s -> {regression['current_s']}s (x{regression['ratio']})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import mmap
+import shutil
+import numpy as np
+import pandas as pd
+import nexpose_schema
+
+
+class DeferredTextStore:
+    """
+    Side store for the wide free-text columns of a report (description, proof, solution).
+
+    The columns are taken out of every batch as soon as it is loaded, so the filters and transformations
+    never copy them. Each column is appended to a file of UTF-8 bytes with an offsets array, keyed by the
+    row position in the report (the index pd.read_csv assigns). `restore` memory-maps the files and decodes
+    only the rows that are left at export time.
+    """
+
+    def __init__(self, store_path, columns=None):
+        self.store_path = store_path
+        self.columns = columns or nexpose_schema.STRING_COLUMNS
+        self.file_columns = None
+        self._positions = []
+        self._lengths = {}
+        self.positions = None
+        self.offsets = None
+        shutil.rmtree(self.store_path, ignore_errors=True)
+        os.makedirs(self.store_path)
+
+    def column_path(self, column):
+        return os.path.join(self.store_path, column.replace(' ', '_') + '.bin')
+
+    def _set_file_columns(self, file_columns):
+        # Only the text columns the report actually has are deferred.
+        self.file_columns = list(file_columns)
+        self.columns = [column for column in self.columns if column in self.file_columns]
+        self._lengths = {column: [] for column in self.columns}
+
+    def add(self, batch):
+        """move the text columns of a batch into the store and return the batch without them"""
+        if self.file_columns is None:
+            self._set_file_columns(batch.columns)
+        self._positions.append(batch.index.to_numpy())
+        for column in self.columns:
+            values = batch[column].fillna('').astype(str)
+            encoded = values.str.encode('utf-8')
+            self._lengths[column].append(encoded.str.len().to_numpy(dtype=np.int64))
+            with open(self.column_path(column), 'ab') as file:
+                file.write(b''.join(encoded))
+        self.positions = None
+        return batch.drop(columns=self.columns)
+
+    def read_csv(self, file_path, chunk_rows=20000):
+        """
+        Stream only the text columns of a CSV report into the store, in batches of `chunk_rows` rows.
+        Returns the other columns of the file, to be read with `usecols`: the text is never held in
+        memory next to the rest of the report.
+        """
+        self._set_file_columns(pd.read_csv(file_path, nrows=0).columns)
+        if self.columns:
+            with pd.read_csv(file_path, usecols=self.columns, dtype=str, chunksize=chunk_rows) as reader:
+                for batch in reader:
+                    self.add(batch)
+        return [column for column in self.file_columns if column not in self.columns]
+
+    def defer(self, batches):
+        """pass batches through `add`"""
+        for batch in batches:
+            yield self.add(batch)
+
+    def _build_index(self):
+        positions = np.concatenate(self._positions) if self._positions else np.zeros(0, dtype=np.int64)
+        if len(positions) > 1 and (np.diff(positions) <= 0).any():
+            raise ValueError("Deferred text rows must be added in increasing row position order")
+        self.positions = positions
+        self.offsets = {column: np.concatenate([[0], np.cumsum(np.concatenate(lengths))]) if lengths else np.zeros(1, dtype=np.int64)
+                        for column, lengths in self._lengths.items()}
+
+    def lookup(self, column, positions):
+        """text of `column` for the given row positions"""
+        if self.positions is None:
+            self._build_index()
+        rows = np.searchsorted(self.positions, positions)
+        if len(rows) and (rows.max() >= len(self.positions) or (self.positions[rows] != positions).any()):
+            raise KeyError(f"Row positions not found in the deferred text store of '{column}'")
+        starts, ends = self.offsets[column][rows], self.offsets[column][rows + 1]
+        if not len(rows) or not self.offsets[column][-1]:
+            return [''] * len(rows)
+        with open(self.column_path(column), 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return [buffer[start:end].decode('utf-8') for start, end in zip(starts, ends)]
+
+    def restore(self, data):
+        """join the text columns back for the rows of `data`, at their original column positions"""
+        if self.file_columns is None:
+            return data
+        positions = data.index.to_numpy()
+        for column in self.columns:
+            values = pd.Series(self.lookup(column, positions), index=data.index, dtype=object)
+            if column in data.columns:
+                data[column] = values
+                continue
+            present = [name for name in self.file_columns[:self.file_columns.index(column)] if name in data.columns]
+            data.insert(data.columns.get_loc(present[-1]) + 1 if present else len(data.columns), column, values)
+        return data
+
+    def close(self):
+        shutil.rmtree(self.store_path, ignore_errors=True)
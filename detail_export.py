@@ -0,0 +1,79 @@
+import os
+from fnmatch import fnmatchcase
+from concurrent.futures import ThreadPoolExecutor
+from streaming_excel_writer import StreamingExcelWriter
+
+# Export profiles of the asset analysis workbooks:
+#   'summary'  - the summary sheet only
+#   'selected' - the summary plus the detail sheets matching `detail_sheets` (sheet names or fnmatch
+#                patterns such as 'C1_*' or '*_expl_unq')
+#   'full'     - the summary plus every detail sheet
+EXPORT_PROFILES = ('summary', 'selected', 'full')
+# Detail sheets go into the workbook ('xlsx', streamed one sheet at a time) or to side files next to it.
+DETAIL_FORMATS = ('xlsx', 'csv')
+EXCEL_SHEET_NAME_LENGTH = 31
+
+
+def select_detail_sheets(names, export_profile='full', detail_sheets=None):
+    """the detail sheet names to export, in the given order"""
+    if export_profile not in EXPORT_PROFILES:
+        raise ValueError(f"Unknown export profile '{export_profile}', expected one of {EXPORT_PROFILES}")
+    if export_profile == 'summary':
+        return []
+    if export_profile == 'full':
+        return list(names)
+    return [name for name in names if any(fnmatchcase(name, pattern) for pattern in detail_sheets or [])]
+
+
+def excel_sheet_names(names):
+    """Excel-safe sheet name (at most 31 characters, unique) for every name"""
+    sheet_names = {}
+    for name in names:
+        sheet_name = name[:EXCEL_SHEET_NAME_LENGTH]
+        number = 1
+        while sheet_name in sheet_names.values():
+            suffix = f'~{number}'
+            sheet_name = name[:EXCEL_SHEET_NAME_LENGTH - len(suffix)] + suffix
+            number += 1
+        sheet_names[name] = sheet_name
+    return sheet_names
+
+
+def side_file_path(output_file_path, sheet_name, detail_format):
+    """path of the side file of a detail sheet, next to the workbook"""
+    return f'{os.path.splitext(output_file_path)[0]}_{sheet_name}.{detail_format}'
+
+
+def export_workbook(output_file_path, summary_sheets, detail_sheets, detail_format='xlsx', max_workers=None):
+    """
+    Write the workbook of an analysis.
+
+    :param summary_sheets: Mapping of sheet name to DataFrame, written last (after the detail sheets).
+    :param detail_sheets: Mapping of sheet name to a function returning the DataFrame; each frame is only
+        built when its sheet is written, and released before the next one.
+    :param detail_format: 'xlsx' streams the detail sheets into the workbook; 'csv' writes them
+        to side files in parallel and the workbook only holds the summary.
+    :return: Mapping of sheet name to the number of rows written.
+    """
+    if detail_format not in DETAIL_FORMATS:
+        raise ValueError(f"Unknown detail format '{detail_format}', expected one of {DETAIL_FORMATS}")
+    rows_written = {}
+
+    if detail_format != 'xlsx' and detail_sheets:
+        def write_side_file(name):
+            data = detail_sheets[name]()
+            file_path = side_file_path(output_file_path, name, detail_format)
+            data.to_csv(file_path, index=False)
+            return name, len(data.index)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            rows_written.update(pool.map(write_side_file, detail_sheets))
+
+    sheet_names = excel_sheet_names(list(detail_sheets if detail_format == 'xlsx' else []) + list(summary_sheets))
+    with StreamingExcelWriter(output_file_path) as writer:
+        if detail_format == 'xlsx':
+            for name, build in detail_sheets.items():
+                rows_written[name] = writer.write_sheet(sheet_names[name], build())
+        for name, data in summary_sheets.items():
+            rows_written[name] = writer.write_sheet(sheet_names[name], data)
+    return rows_written
@@ -1,27 +1,63 @@
 import os
-import sys
 import math
+import time
+import hashlib
 import pandas as pd
 import numpy as np
 import requests
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from urllib3.exceptions import InsecureRequestWarning
 from inventory_files_config import hi_config
+from streaming_excel_writer import StreamingExcelWriter
+from report_cache import ReportCache
+from incremental_state import IncrementalState
+from deferred_text import DeferredTextStore
+from perf_metrics import metrics, record_performance
+import incremental_state
+import vulnerability_transforms as transforms
+import nexpose_schema
 
 # Disable warnings for insecure requests.
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 
+REPORT_HEADER_FORMAT = {'bold': True, 'bg_color': '#D9E1F2', 'border': 1}
+REPORT_COLUMN_FORMATS = {
+    'Vulnerability CVSS Score': {'num_format': '0.0'},
+    'Vulnerability CVSSv2 Score': {'num_format': '0.0'},
+    'Vulnerability Risk Score': {'num_format': '#,##0.00'},
+    'Vulnerable Since': {'num_format': 'yyyy-mm-dd hh:mm:ss'},
+    'Vulnerability Test Date': {'num_format': 'yyyy-mm-dd hh:mm:ss'},
+}
 
+
+@record_performance()
 class VulnerabilityReportProcessor:
     def __init__(self, config, download_new_reports=True):
+        self.config = config
         self.download_new_reports = download_new_reports
         self.input_path = config['paths']['input_path']
         self.output_path = config['paths']['output_path']
         self.merge_files_path = config['paths']['merge_files_path']
         self.report_dict = config['report_dict']
         self.merge_files_dict = config['merge_files_dict']
+        options = config.get('options', {})
+        self.stream_reports = options.get('stream_reports', True)
+        self.chunk_rows = options.get('chunk_rows', 200000)
+        self.max_workers = options.get('max_workers', 4)
+        self.process_workers = options.get('process_workers', 0)
+        self.excel_writer = options.get('excel_writer', 'streaming')
+        self.defer_text_columns = options.get('defer_text_columns', False)
+        # Processed reports kept in memory (by output filename) so the master files can be built
+        # without parsing the workbooks that were just written.
+        self.processed_reports = {}
+        cache_path = options.get('report_cache_path')
+        self.report_cache = ReportCache(cache_path) if cache_path else None
+        state_path = options.get('incremental_state_path')
+        self.incremental_state = IncrementalState(state_path) if state_path else None
 
         self.MAX_SHEET_ROWS = 1048000
+        self.DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+        self.DOWNLOAD_PROGRESS_STEP = 100 * 1024 * 1024
         self.headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json;charset=UTF-8',
@@ -29,118 +65,294 @@ class VulnerabilityReportProcessor:
         }
 
     def filter_to_last_30_days(self, data):
-        # Figure out the date 30 days ago
-        target_date = datetime.today() - timedelta(days=30)
-        # Conditionally drops rows with a test date greater than 45 days old.
-        data.drop(data[data['Vulnerability Test Date'] < target_date].index, inplace=True)
+        # Conditionally drops rows with a test date older than 30 days.
+        data.drop(data[transforms.stale_test_date_rows(data, days=30)].index, inplace=True)
         return data
 
     def filter_to_severity_7(self, data):
         # TODO: Consider removing hard-coded value for severity.
         # NOTE: Experimenting with a boolean value for sorting the vulnerability. We want v3 scores with a value of 0 to use for v2 score fallback.
-        data.drop(data[data['Vulnerability CVSS Score'] < 7.0].index, inplace=True)
+        data.drop(data[transforms.below_severity_rows(data, 7.0)].index, inplace=True)
         return data
 
+    def build_filter_plan(self):
+        # Row filters of the standard processing, evaluated together on the unfiltered data.
+        plan = transforms.FilterPlan()
+        plan.exclude('older_than_30_days', lambda data: transforms.stale_test_date_rows(data, days=30))
+        plan.exclude('severity_below_7', lambda data: transforms.below_severity_rows(data, 7.0))
+        return plan
+
     def merge_severity_scores(self, data):
-        # NOTE: Built using this strategy https://stackoverflow.com/questions/55498357/update-pandas-column-with-another-columns-values-using-loc
-        data['Vulnerability CVSS Score'] = np.where(data['Vulnerability CVSSv3 Score'].ne(0),
-                                                    data['Vulnerability CVSSv3 Score'],
-                                                    data['Vulnerability CVSS Score'])
-        # After the above step, delete the v3 row as it is no longer needed.
-        data.drop('Vulnerability CVSSv3 Score', axis=1, inplace=True)
-        return data
+        return transforms.merge_severity_scores(data)
 
-    def score_to_severity(self, x):
-        # In the column immediately after (Column G?)
-        # add a string label identifying the vulnerability as a "high" or
-        # "critical" severity for easy human readability and metrics sorting.
-        if x == 0:
-            return "None"
-        elif 0.1 <= x <= 3.9:
-            return "Low"
-        elif 4.0 <= x <= 6.9:
-            return "Medium"
-        elif 7.0 <= x <= 8.9:
-            return "High"
-        elif 9.0 <= x <= 10.0:
-            return "Critical"
-        return ""
-
-    def download_report_to_dataframe(self, report_id, report_name):
-        # TODO: Implement date checking.
-        # Fetches the latest report for the given id.
+    def download_report_to_file(self, report_id, report_name, extra_headers=None):
+        # Fetches the latest report for the given id and streams it straight to disk,
+        # so the report is never held in memory as a single bytes object.
+        # Returns the file name (None when the server answered 304 Not Modified) and the
+        # validators / content hash of the download.
         url = f"https://vmo7222pa005.otis.com:3780/api/3/reports/{report_id}/history/latest/output"
-        response = requests.request("GET", url, headers=self.headers, verify=False)
         target_filename = os.path.join(self.input_path, report_name + ".csv")
-        with open(target_filename, "wb") as file:
-            file.write(response.content)
-        data = pd.read_csv(target_filename, dtype={
-            'Asset IP Address': 'str',
-            'Asset Names': 'str',
-            'Asset Location': 'str',
-            'Vulnerability Title': 'str',
-            'Vulnerability CVE IDs': 'str',
-            'Vulnerability CVSSv3 Score': np.float64,
-            'Vulnerability CVSSv2 Score': np.float64,
-            'Vulnerability Risk Score': 'str',
-            'Vulnerability Description': 'str',
-            'Vulnerability Proof': 'str',
-            'Vulnerability Solution': 'str',
-            'Asset OS Version': 'str',
-            'Asset OS Name': 'str',
-            'Asset OS Family': 'str',
-            'Vulnerability Age': 'str',
-            'Vulnerable Since': 'str',
-            'Vulnerability Test Date': 'str',
-            'Vulnerability ID': 'str'
-        })
-        data.fillna('', inplace=True)
-
-        # Convert 'Vulnerability Risk Score' removing commas and converting to float.
-        data['Vulnerability Risk Score'] = data['Vulnerability Risk Score'].replace(',', '', regex=True)
-        data['Vulnerability Risk Score'] = pd.to_numeric(data['Vulnerability Risk Score'], errors='ignore')
-
-        # Convert date fields from string to datetime.
-        data['Vulnerable Since'] = pd.to_datetime(data['Vulnerable Since'], errors='ignore')
-        data['Vulnerability Test Date'] = pd.to_datetime(data['Vulnerability Test Date'], errors='ignore')
+        content_hash = hashlib.sha256()
+        with requests.request("GET", url, headers={**self.headers, **(extra_headers or {})},
+                              verify=False, stream=True) as response:
+            if response.status_code == 304:
+                print(f"...report {report_id} ({report_name}) not modified since the last download")
+                return None, {'not_modified': True}
+            response.raise_for_status()
+            # Content-Length is the size on the wire; with gzip / deflate the decoded content is larger, so the
+            # progress and the completeness check use the bytes read from the connection (response.raw.tell()).
+            total_bytes = int(response.headers.get('Content-Length') or 0)
+            downloaded_bytes = 0
+            wire_bytes = 0
+            next_progress = self.DOWNLOAD_PROGRESS_STEP
+            with open(target_filename, "wb") as file:
+                for chunk in response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_BYTES):
+                    if not chunk:
+                        continue
+                    file.write(chunk)
+                    content_hash.update(chunk)
+                    downloaded_bytes += len(chunk)
+                    wire_bytes = response.raw.tell()
+                    if downloaded_bytes >= next_progress:
+                        if total_bytes:
+                            print(f"...downloaded {wire_bytes / total_bytes:.0%} of {report_name} "
+                                  f"({wire_bytes:,} / {total_bytes:,} bytes)")
+                        else:
+                            print(f"...downloaded {downloaded_bytes:,} bytes of {report_name}")
+                        next_progress += self.DOWNLOAD_PROGRESS_STEP
+            download_info = {
+                'not_modified': False,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': content_hash.hexdigest(),
+                'bytes': downloaded_bytes,
+            }
+            wire_bytes = response.raw.tell()
+        if total_bytes and wire_bytes != total_bytes:
+            raise IOError(f"Incomplete download for report {report_id}: "
+                          f"received {wire_bytes:,} of {total_bytes:,} bytes")
+        print(f"...saved {downloaded_bytes:,} bytes to {target_filename}")
+        return target_filename, download_info
 
+    def convert_report_types(self, data, date_parser=None):
+        # Risk score and dates are parsed, missing text becomes '' (see nexpose_schema).
+        return nexpose_schema.apply_schema(data, date_parser)
+
+    def read_report_file(self, target_filename):
+        date_parser = nexpose_schema.DateParser()
+        data = pd.read_csv(target_filename, dtype=nexpose_schema.read_dtypes())
+        data = self.convert_report_types(data, date_parser)
+        self.report_invalid_dates(target_filename, date_parser)
         return data
 
+    def iter_report_file(self, target_filename):
+        # Typed report data: batches of `chunk_rows` rows in streaming mode, otherwise the whole file.
+        if self.stream_reports:
+            # One parser per file, so the timestamp format is only detected on the first batch.
+            date_parser = nexpose_schema.DateParser()
+            with pd.read_csv(target_filename, dtype=nexpose_schema.read_dtypes(), chunksize=self.chunk_rows) as reader:
+                for chunk in reader:
+                    yield self.convert_report_types(chunk, date_parser)
+            self.report_invalid_dates(target_filename, date_parser)
+        else:
+            yield self.read_report_file(target_filename)
+
+    def report_invalid_dates(self, target_filename, date_parser):
+        for column, invalid_count in date_parser.invalid_counts.items():
+            if invalid_count:
+                print(f"WARNING: {invalid_count:,} unparseable '{column}' values in {target_filename} "
+                      f"(format: {date_parser.formats.get(column)}), set to NaT")
+
+    def load_report_batches(self, report_id, report_name):
+        # Downloads the report unless the cache shows it is unchanged upstream (304 response or the
+        # same content hash); in that case the cached typed snapshot is used and the CSV is not parsed.
+        if self.report_cache is None:
+            target_filename, _ = self.download_report_to_file(report_id, report_name)
+            return self.iter_report_file(target_filename)
+
+        metadata = self.report_cache.load_metadata(report_id)
+        target_filename, download_info = self.download_report_to_file(
+            report_id, report_name, extra_headers=self.report_cache.conditional_headers(metadata))
+        if download_info['not_modified'] and metadata:
+            print(f"...using cached snapshot of {report_name}")
+            return self.report_cache.read_snapshot(report_id, metadata)
+        if download_info['not_modified']:
+            # The server has a newer copy than our (incomplete) cache entry; download it unconditionally.
+            target_filename, download_info = self.download_report_to_file(report_id, report_name)
+        elif metadata.get('content_hash') == download_info['content_hash']:
+            print(f"...{report_name} is unchanged, using cached snapshot")
+            metadata = self.report_cache.update_validators(report_id, metadata, download_info)
+            return self.report_cache.read_snapshot(report_id, metadata)
+        return self.report_cache.write_snapshot(report_id, self.iter_report_file(target_filename), download_info)
+
+    def process_report_batches(self, batches, report_name):
+        # Every batch goes through the standard processing on its own. All processing steps are
+        # row-local, so only the surviving rows are kept and in streaming mode peak memory depends
+        # on the batch size, not the report size.
+        processed_chunks = []
+        total_rows = 0
+        for chunk_number, chunk in enumerate(batches, start=1):
+            total_rows += len(chunk.index)
+            chunk = self.perform_standard_processing(chunk)
+            print(f"...processed batch {chunk_number} of {report_name} "
+                  f"(rows read: {total_rows:,}, rows kept: {len(chunk.index):,})")
+            processed_chunks.append(chunk)
+        if not processed_chunks:
+            return pd.DataFrame(columns=list(nexpose_schema.read_dtypes()))
+        # Batches can carry different categories, so the categorical columns are rebuilt after the concat.
+        return nexpose_schema.restore_categoricals(pd.concat(processed_chunks))
+
+    def process_report_batches_incremental(self, report_id, batches, report_name):
+        # Incremental mode: rows whose stable content is identical to last run's input are not transformed
+        # again. Their processed version comes from the stored state, gets this export's age / test date /
+        # risk score (incremental_state.VOLATILE_COLUMNS) and is re-checked against the 30-day window (the
+        # other filters depend on the stable content alone). New and changed rows go through the standard
+        # processing. Every row keeps its position in the report, so the result matches a full run.
+        # A row is only reused when a stored processed row matches it: a row a filter dropped last run (e.g.
+        # a stale test date that has been rescanned since) has nothing to reuse and is processed again.
+        previous = self.incremental_state.load(report_id)
+        if previous is not None:
+            stored_counts = pd.Series(previous['processed_hashes']).value_counts()
+            matched_counts = pd.Series(dtype='int64')
+        pieces, piece_hashes = [], []
+        current_keys, current_hashes = [], []
+        unchanged_positions, unchanged_hashes, unchanged_volatile = [], [], []
+        delta = {'new': 0, 'changed': 0, 'unchanged': 0, 'closed': 0}
+        for batch in batches:
+            batch_keys = incremental_state.key_hashes(batch)
+            batch_hashes = incremental_state.row_hashes(batch)
+            current_keys.append(batch_keys)
+            current_hashes.append(batch_hashes)
+            if previous is None:
+                unchanged = np.zeros(len(batch.index), dtype=bool)
+                new = ~unchanged
+            else:
+                unchanged = np.isin(batch_hashes, previous['row_hashes'])
+                unchanged[unchanged], matched_counts = self.match_stored_rows(batch_hashes[unchanged], stored_counts,
+                                                                              matched_counts)
+                new = ~unchanged & ~np.isin(batch_keys, previous['keys'])
+            delta['unchanged'] += int(unchanged.sum())
+            delta['new'] += int(new.sum())
+            delta['changed'] += int((~unchanged & ~new).sum())
+            unchanged_positions.append(batch.index.to_numpy()[unchanged])
+            unchanged_hashes.append(batch_hashes[unchanged])
+            unchanged_volatile.append(batch.loc[unchanged, incremental_state.volatile_columns(batch)])
+
+            if unchanged.all():
+                continue
+            hash_by_position = pd.Series(batch_hashes, index=batch.index)
+            chunk = self.perform_standard_processing(batch[~unchanged].copy() if unchanged.any() else batch)
+            pieces.append(chunk)
+            piece_hashes.append(hash_by_position.loc[chunk.index].to_numpy())
+
+        if previous is not None:
+            closed = self.closed_findings(previous, np.concatenate(current_keys))
+            delta['closed'] = len(closed.index)
+            self.write_closed_findings(report_name, closed)
+            reused, reused_hashes = self.reuse_processed_rows(previous, np.concatenate(unchanged_positions),
+                                                              np.concatenate(unchanged_hashes),
+                                                              pd.concat(unchanged_volatile))
+            pieces.append(reused)
+            piece_hashes.append(reused_hashes)
+        print(f"...{report_name} delta: {delta['new']:,} new, {delta['changed']:,} changed, "
+              f"{delta['unchanged']:,} unchanged, {delta['closed']:,} closed")
+
+        if not pieces:
+            return pd.DataFrame(columns=list(nexpose_schema.read_dtypes())), delta
+        data = pd.concat(pieces)
+        hashes = np.concatenate(piece_hashes)
+        order = np.argsort(data.index.to_numpy(), kind='stable')
+        data = nexpose_schema.restore_categoricals(data.iloc[order])
+        self.incremental_state.save(report_id, np.concatenate(current_keys), np.concatenate(current_hashes),
+                                    data, hashes[order], delta)
+        return data, delta
+
+    def match_stored_rows(self, hashes, stored_counts, matched_counts):
+        # Which of these unchanged rows have a stored processed row left to reuse: the n-th row with a hash
+        # (counted over the whole report, matched_counts holds the earlier batches) matches when at least n
+        # processed rows with that hash were stored.
+        hashes = pd.Series(hashes)
+        occurrence = hashes.groupby(hashes).cumcount().to_numpy() + hashes.map(matched_counts).fillna(0).to_numpy(dtype=np.int64)
+        matched = occurrence < hashes.map(stored_counts).fillna(0).to_numpy(dtype=np.int64)
+        return matched, matched_counts.add(hashes[matched].value_counts(), fill_value=0)
+
+    def reuse_processed_rows(self, previous, positions, hashes, volatile):
+        # Match the stored processed rows to the unchanged rows of this run by row hash (and occurrence,
+        # for identical duplicate rows) and give them their current position in the report.
+        current = pd.DataFrame({'hash': hashes, 'position': positions})
+        current['occurrence'] = current.groupby('hash').cumcount()
+        stored = pd.DataFrame({'hash': previous['processed_hashes'], 'row': np.arange(len(previous['processed_hashes']))})
+        stored['occurrence'] = stored.groupby('hash').cumcount()
+        matched = stored.merge(current, on=['hash', 'occurrence'])
+
+        reused = previous['processed'].iloc[matched['row'].to_numpy()].copy()
+        reused.index = matched['position'].to_numpy()
+        # The volatile columns (age, test date, risk score) come from this export, by position.
+        for column in volatile.columns:
+            if column in reused.columns:
+                reused[column] = volatile[column]
+        reused_hashes = pd.Series(matched['hash'].to_numpy(), index=reused.index)
+        reused = self.filter_to_last_30_days(reused)
+        return reused, reused_hashes.loc[reused.index].to_numpy()
+
+    def closed_findings(self, previous, current_keys):
+        # Published findings of the previous run whose asset / vulnerability key is not in this export.
+        processed = previous['processed']
+        if not len(processed.index):
+            return processed
+        return processed[~np.isin(incremental_state.key_hashes(processed), current_keys)]
+
+    def write_closed_findings(self, report_name, closed):
+        file_path = os.path.join(self.output_path, f"{os.path.splitext(report_name)[0]} - Closed.csv")
+        closed.to_csv(file_path, index=False)
+        print(f"...{len(closed.index):,} closed findings of {report_name} written to {file_path}")
+
     # Takes a dataframe and performs all the typical process steps on it.
     def perform_standard_processing(self, data):
-        # Every single file is filtered for the last 30 days
-        data = self.filter_to_last_30_days(data)
+        # Every single file is filtered for the last 30 days and to CVSSv3 severity 7 or higher. Both filters
+        # run as one pass, so the frame is copied once and the derived columns only cover the survivors.
+        data = self.build_filter_plan().apply(data)
         data = self.merge_severity_scores(data)
-        # New addition: Add a column for severity level (critical, high, etc).
-        # Every single filedis filtered to have only CVSSv3 Severity 7 or Higher.
-        data = self.filter_to_severity_7(data)
         # The above method destroys the v3 column and overwrites the non-zero v3 values into a single "CVSS score" column. With that
         # created, we then assign the Criticality tags.
-        data.insert(loc=6, column='Vulnerability CVSSv3 Severity', value=data['Vulnerability CVSS Score'].apply(self.score_to_severity))
+        data = transforms.add_severity_column(data, loc=6)
         # Add a column at the end that represents the unique ID of the vulnerability.
         # In order words, a specific instance of a vulnerability on a specific asset.
         # This is a concatenation of the asset name and the vulnerabilityID
-        data['Unique Vulnerability ID'] = data['Asset Names'] + ' ' + data['Vulnerability ID']
-        data.fillna('', inplace=True)  # Remove any empty entries
+        data = transforms.add_unique_vulnerability_id(data)
+        data = nexpose_schema.fill_missing_text(data)  # Remove any empty entries
         return data
 
+    def write_excel_sheets(self, file_path, sheet_list):
+        # Writes (sheet_name, DataFrame) pairs into one workbook. The 'streaming' writer streams rows
+        # into the xlsx file in constant memory; 'pandas' keeps the previous pd.ExcelWriter behaviour.
+        if self.excel_writer == 'streaming':
+            with StreamingExcelWriter(file_path, column_formats=REPORT_COLUMN_FORMATS,
+                                      header_format=REPORT_HEADER_FORMAT) as writer:
+                for sheet_name, data in sheet_list:
+                    writer.write_sheet(sheet_name, data)
+        else:
+            with pd.ExcelWriter(file_path) as writer:
+                for sheet_name, data in sheet_list:
+                    data.to_excel(writer, sheet_name=sheet_name, index=False)
+
     # Processes the list of files (workstation OS, sever applications, etc.) with the intent of
     # stitching them into a single file.
     def publish_data_into_excel_file_with_sheets(self, filename, sheet_list):
         print("Building Excel file {}...".format(filename))
         # Excel file will be created with static filename
-        with pd.ExcelWriter(os.path.join(self.output_path, filename)) as writer:
+        def sheets():
             for sheet_name, data in sheet_list:
                 print(f"Adding sheet {sheet_name} (Count: {len(data.index)}) to file {filename}")
-                data.to_excel(writer, sheet_name=sheet_name, index=False)
+                yield sheet_name, data
+        self.write_excel_sheets(os.path.join(self.output_path, filename), sheets())
         print("...finished building {}.\n".format(filename))
 
     def publish_data_into_excel_file(self, filename, file):
         # Processing an individual file into an excel spreadsheet.
         sheet_name = 'Data'
         print(f"Building Excel file {filename}...")
-        with pd.ExcelWriter(os.path.join(self.output_path, filename)) as writer:
-            file.to_excel(writer, sheet_name=sheet_name, index=False)
+        self.write_excel_sheets(os.path.join(self.output_path, filename), [(sheet_name, file)])
         print("...finished processing {}.\n".format(filename))
 
     # merge HI - OS and Application files into single Excel File
@@ -149,17 +361,35 @@ class VulnerabilityReportProcessor:
             files_set = merge_files_set['files_set']
             master_file_name = merge_files_set['master_file_name']
             print(f"Creating master file {master_file_name} (with: {files_set})")
-            print(merge_files_set)
-            with pd.ExcelWriter(os.path.join(self.merge_files_path, master_file_name)) as writer:
-                for idx, file_path in enumerate(files_set, start=1):
-                    print(f"Read data from file {file_path}")
 
-                    xls = pd.ExcelFile(os.path.join(self.output_path, file_path))
-                    for sheet_number, sheet_name in enumerate(xls.sheet_names, start=1):
-                        df = pd.read_excel(os.path.join(self.output_path, file_path), sheet_name=sheet_name)
+            def sheets():
+                for idx, file_path in enumerate(files_set, start=1):
+                    for sheet_number, df in enumerate(self.load_processed_report_sheets(file_path), start=1):
                         new_sheet_name = ('OS' if idx == 1 else 'APP') + (str(sheet_number) if sheet_number > 1 else '')
-                        df.to_excel(writer, sheet_name=new_sheet_name, index=False)
+                        yield new_sheet_name, df
                         print(f"add data to sheet {new_sheet_name}")
+                    # All sheets of this report are written, release it before the next one is split.
+                    self.processed_reports.pop(file_path, None)
+            try:
+                self.write_excel_sheets(os.path.join(self.merge_files_path, master_file_name), sheets())
+            except Exception as e:
+                print(f"Error creating master file {master_file_name}: {str(e)}")
+            finally:
+                for file_path in files_set:
+                    self.processed_reports.pop(file_path, None)
+
+    def load_processed_report_sheets(self, file_path):
+        # Sheets of a processed report, taken from the in-memory copy kept by process_report.
+        # Reports that were not processed in this run fall back to the workbook in the output folder.
+        data = self.processed_reports.get(file_path)
+        if data is not None:
+            print(f"Read data for {file_path} from the processed report")
+            for _, df in self.split_dataframe(file_path, data):
+                yield df
+        else:
+            print(f"Read data from file {file_path}")
+            sheet_dict = pd.read_excel(os.path.join(self.output_path, file_path), sheet_name=None)
+            yield from sheet_dict.values()
 
     def split_dataframe(self, base_filename, base_df):
         num_sheets = math.ceil(len(base_df) / self.MAX_SHEET_ROWS)
@@ -177,42 +407,156 @@ class VulnerabilityReportProcessor:
             print("Bypassing download of new reports. Continuing the publication step.")
             # Upload to Sharepoint
 
-    def download_and_process_reports(self):
-        for report_id, filename in self.report_dict.items():
-            try:
-                if filename is None:
-                    print(f"ERROR: Unable to determine filename given report ID: {report_id}\nExiting.")
-                    sys.exit(0)
+    def process_report(self, report_id, filename):
+        # Download, process and publish a single report. Returns the timings of every step so
+        # the run summary can show which report (and which step) was slow.
+        if filename is None:
+            raise ValueError(f"Unable to determine filename given report ID: {report_id}")
 
-                print(f"Generating dataframe for {filename}...")
-                # Download the equivalent report to a dataframe
-                data = self.download_report_to_dataframe(report_id, filename)
-                print(f"...done generating.")
+        timings = {}
+        started = time.perf_counter()
+        print(f"Generating dataframe for {filename}...")
+        batches = self.load_report_batches(report_id, filename)
+        timings['download'] = time.perf_counter() - started
 
-                # Execute standard processing steps (merge severity scores, assign severity labels, etc.)
-                data = self.perform_standard_processing(data)
+        # The description / proof / solution text is moved to a side store while the report is processed
+        # and only joined back for the rows that are published.
+        text_store = None
+        if self.defer_text_columns:
+            text_store = DeferredTextStore(os.path.join(self.input_path, f"{report_id}.text"))
+            batches = text_store.defer(batches)
+        try:
+            # Execute standard processing steps (merge severity scores, assign severity labels, etc.)
+            step_started = time.perf_counter()
+            if self.incremental_state is not None:
+                data, delta = self.process_report_batches_incremental(report_id, batches, filename)
+                timings.update(delta)
+            else:
+                data = self.process_report_batches(batches, filename)
+            timings['process'] = time.perf_counter() - step_started
+            print(f"...done generating {filename}.")
 
-                if data.shape[0]:
-                    print(f"ERROR: Data is empty for report ID: {report_id}\nExiting.")
-                    sys.exit(0)
+            if not data.shape[0]:
+                raise ValueError(f"Data is empty for report ID: {report_id}")
 
-                # continue with processing.
-                print("Splitting original dataframe into sheets if needed...")
-                sheets = self.split_dataframe(filename, data)
-                self.publish_data_into_excel_file_with_sheets(filename, sheets)
+            # continue with processing.
+            step_started = time.perf_counter()
+            if text_store is not None:
+                data = text_store.restore(data)
+        finally:
+            if text_store is not None:
+                text_store.close()
+        print(f"Splitting {filename} dataframe into sheets if needed...")
+        sheets = self.split_dataframe(filename, data)
+        self.publish_data_into_excel_file_with_sheets(filename, sheets)
+        # Only reports that go into a master file are kept for the merge step.
+        if any(filename in merge_files_set['files_set'] for merge_files_set in self.merge_files_dict):
+            self.processed_reports[filename] = data
+        timings['write'] = time.perf_counter() - step_started
+        timings['total'] = time.perf_counter() - started
+        return len(data.index), timings
 
-            except Exception as e:
-                print(f"Error processing report {filename}: {str(e)}")
-                continue
-        self.merge_split_files_to_master_excel_file()
+    def download_and_process_reports(self):
+        if self.process_workers:
+            run_summary = self.process_report_groups()
+        else:
+            run_summary = self.process_reports()
+            self.merge_split_files_to_master_excel_file()
+        self.print_run_summary(run_summary)
         print("...done.")
 
+    def process_reports(self):
+        # Reports run concurrently: while one report is being transformed and written, the
+        # downloads of the next ones are already in flight. A failing report is recorded in the
+        # summary and does not stop the others.
+        run_summary = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_report = {executor.submit(self.process_report, report_id, filename): (report_id, filename)
+                                for report_id, filename in self.report_dict.items()}
+            for future in as_completed(future_to_report):
+                report_id, filename = future_to_report[future]
+                try:
+                    rows, timings = future.result()
+                    run_summary.append({'report_id': report_id, 'report': filename, 'status': 'OK',
+                                        'rows': rows, **timings})
+                except Exception as e:
+                    print(f"Error processing report {filename}: {str(e)}")
+                    run_summary.append({'report_id': report_id, 'report': filename, 'status': 'FAILED',
+                                        'error': str(e)})
+        return run_summary
+
+    def build_report_groups(self):
+        # Reports that end up in the same master file form one group, every other report is a group
+        # of its own. A group is processed and merged entirely inside one worker process.
+        report_groups = []
+        grouped_reports = set()
+        for merge_files_set in self.merge_files_dict:
+            report_dict = {report_id: filename for report_id, filename in self.report_dict.items()
+                           if filename in merge_files_set['files_set']}
+            grouped_reports.update(report_dict)
+            report_groups.append((report_dict, [merge_files_set]))
+        for report_id, filename in self.report_dict.items():
+            if report_id not in grouped_reports:
+                report_groups.append(({report_id: filename}, []))
+        return report_groups
+
+    def process_report_groups(self):
+        # Process-pool mode for the CPU-bound pandas work: each worker process downloads, transforms and
+        # publishes its group of reports and builds the group's master file itself, so no DataFrame is
+        # ever sent between processes; only the run summary entries come back.
+        run_summary = []
+        report_groups = self.build_report_groups()
+        with ProcessPoolExecutor(max_workers=self.process_workers) as executor:
+            future_to_group = {executor.submit(process_report_group, self.config, report_dict, merge_files_dict): report_dict
+                               for report_dict, merge_files_dict in report_groups}
+            for future in as_completed(future_to_group):
+                report_dict = future_to_group[future]
+                try:
+                    group_summary, group_stages = future.result()
+                    run_summary.extend(group_summary)
+                    metrics.merge(group_stages)
+                except Exception as e:
+                    print(f"Error processing reports {list(report_dict.values())}: {str(e)}")
+                    run_summary.extend({'report_id': report_id, 'report': filename, 'status': 'FAILED',
+                                        'error': str(e)} for report_id, filename in report_dict.items())
+        return run_summary
+
+    def print_run_summary(self, run_summary):
+        print("\nRun summary:")
+        order = {report_id: position for position, report_id in enumerate(self.report_dict)}
+        for entry in sorted(run_summary, key=lambda item: order[item['report_id']]):
+            if entry['status'] == 'OK':
+                print(f"  {entry['report']}: {entry['rows']:,} rows | download {entry['download']:.1f}s | "
+                      f"process {entry['process']:.1f}s | write {entry['write']:.1f}s | total {entry['total']:.1f}s")
+                if 'new' in entry:
+                    print(f"    new {entry['new']:,} | changed {entry['changed']:,} | "
+                          f"unchanged {entry['unchanged']:,} | closed {entry['closed']:,}")
+            else:
+                print(f"  {entry['report']} (report ID {entry['report_id']}): FAILED - {entry['error']}")
+        print()
+
     def run(self):
         self.manage_reports()
 
 
+def process_report_group(config, report_dict, merge_files_dict):
+    # Entry point of a worker process in process-pool mode. A worker can run several groups, and a forked
+    # worker starts with a copy of the parent's counters, so they are cleared for every group.
+    metrics.reset()
+    processor = VulnerabilityReportProcessor(config=dict(config, report_dict=report_dict, merge_files_dict=merge_files_dict))
+    run_summary = processor.process_reports()
+    processor.merge_split_files_to_master_excel_file()
+    # The counters of this process go back with the summary and are added to the parent's.
+    return run_summary, metrics.summary()['stages']
+
+
 if __name__ == "__main__":
     download = True
+    # per-method timings of the run, for the job dashboards
+    metrics.job = 'hi_report'
+    metrics_json_path = os.path.join(hi_config['paths']['output_path'], "hi_report_perf.json")
+    metrics_prometheus_path = os.path.join(hi_config['paths']['output_path'], "hi_report_perf.prom")
     manager = VulnerabilityReportProcessor(config=hi_config, download_new_reports=download)
     manager.run()
+    metrics.write(metrics_json_path, metrics_prometheus_path)
 
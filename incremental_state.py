@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import key_encoding
+
+KEY_COLUMNS = ['Asset Names', 'Vulnerability ID']
+# Columns that change on every export while the finding itself does not: the age grows every day, rescans
+# move the test date and the risk score follows the age. They are left out of the row hash and taken from
+# the current export for reused rows.
+VOLATILE_COLUMNS = ['Vulnerability Age', 'Vulnerability Test Date', 'Vulnerability Risk Score']
+STATE_VERSION = 2
+
+
+def key_hashes(data):
+    """64-bit hash of the Unique Vulnerability ID parts ('Asset Names', 'Vulnerability ID') of every row"""
+    return key_encoding.hash_keys(data, KEY_COLUMNS)
+
+
+def row_hashes(data):
+    """64-bit hash of the stable content of every row (all columns except VOLATILE_COLUMNS)"""
+    return pd.util.hash_pandas_object(data.drop(columns=VOLATILE_COLUMNS, errors='ignore'), index=False).to_numpy()
+
+
+def volatile_columns(data):
+    return [column for column in VOLATILE_COLUMNS if column in data.columns]
+
+
+class IncrementalState:
+    """
+    Per-report state of the previous run, used for week-over-week incremental processing.
+
+    For every report ID it keeps a compact index of the previous input (sorted unique key hashes and
+    row content hashes, as .npy arrays), the processed rows that were published, and the row hash of
+    each published row so unchanged rows can be reused without transforming them again.
+    """
+
+    def __init__(self, state_path):
+        self.state_path = state_path
+        os.makedirs(self.state_path, exist_ok=True)
+
+    def entry_path(self, report_id):
+        return os.path.join(self.state_path, str(report_id))
+
+    def load(self, report_id):
+        """previous state of a report, or None when there is no usable state"""
+        entry_path = self.entry_path(report_id)
+        try:
+            with open(os.path.join(entry_path, 'metadata.json'), 'r') as file:
+                metadata = json.load(file)
+            if metadata.get('version') != STATE_VERSION:
+                return None
+            return {
+                'metadata': metadata,
+                'keys': np.load(os.path.join(entry_path, 'keys.npy')),
+                'row_hashes': np.load(os.path.join(entry_path, 'row_hashes.npy')),
+                'processed': pd.read_pickle(os.path.join(entry_path, 'processed.pkl')),
+                'processed_hashes': np.load(os.path.join(entry_path, 'processed_hashes.npy')),
+            }
+        except (OSError, ValueError):
+            return None
+
+    def save(self, report_id, keys, input_row_hashes, processed, processed_hashes, delta):
+        """replace the state of a report; the previous state stays in place until the new one is complete"""
+        final_path = self.entry_path(report_id)
+        temp_path = final_path + '.tmp'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        np.save(os.path.join(temp_path, 'keys.npy'), np.unique(keys))
+        np.save(os.path.join(temp_path, 'row_hashes.npy'), np.unique(input_row_hashes))
+        np.save(os.path.join(temp_path, 'processed_hashes.npy'), processed_hashes)
+        processed.to_pickle(os.path.join(temp_path, 'processed.pkl'))
+        with open(os.path.join(temp_path, 'metadata.json'), 'w') as file:
+            json.dump({'version': STATE_VERSION, 'report_id': str(report_id), 'delta': delta,
+                       'saved_at': datetime.now().isoformat(timespec='seconds')}, file, indent=2)
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(temp_path, final_path)
@@ -4,6 +4,16 @@ hi_config = {
         "output_path": "Output_HI",
         "merge_files_path": "Merge_HI"
     },
+    "options": {
+        "stream_reports": True,  # download to disk and process the CSV in batches
+        "chunk_rows": 200000,    # rows per batch when stream_reports is enabled
+        "max_workers": 4,        # reports downloaded and processed concurrently
+        "process_workers": 0,    # > 0 runs each master-file group of reports in its own process
+        "excel_writer": "streaming",  # 'streaming' (constant memory, xlsxwriter) or 'pandas'
+        "defer_text_columns": True,   # keep description/proof/solution on disk until the rows are published
+        "report_cache_path": "Cache_HI",  # reuse unchanged reports between runs; None disables the cache
+        "incremental_state_path": None    # e.g. "State_HI": only transform new/changed findings each week
+    },
     "report_dict": {
         33827: 'GJDE - OS.xlsx', 33828: 'GJDE - Application.xlsx',
         34335: 'eLog - OS.xlsx', 34336: 'eLog - Application.xlsx',
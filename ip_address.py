@@ -0,0 +1,132 @@
+import ipaddress
+import numpy as np
+import pandas as pd
+import key_encoding
+
+# Compact IP address columns. IPv4 addresses are packed into a uint32 and IPv6 addresses into two uint64
+# halves, so dedup, unique counts and joins run on integers instead of ~60-byte strings; the text is only
+# formatted again for the rows that are written out.
+# Anything that is not an address in its canonical text form (host names, typos, '10.0.0.01', upper-case
+# IPv6) is kept as text in a small side table, so every value round-trips exactly and two values are the
+# same key only when their text is the same.
+MISSING, IPV4, IPV6, OTHER = 0, 4, 6, -1
+_LOW_MASK = (1 << 64) - 1
+
+
+class PackedAddresses:
+    """
+    Packed form of a text address column.
+
+    `kinds` holds MISSING / IPV4 / IPV6 / OTHER per row. `low` is a uint32 array while the column only has
+    IPv4 addresses and becomes the low 64 bits (with `high` the high 64 bits) once IPv6 is present; for
+    OTHER rows it is the position of the text in `other`.
+    """
+
+    def __init__(self, kinds, low, high=None, other=None):
+        self.kinds = kinds
+        self.low = low
+        self.high = high
+        self.other = pd.Index(other if other is not None else [], dtype=object)
+        self.column = None
+        self.file_columns = None
+
+    @classmethod
+    def from_text(cls, values):
+        """pack a column of address strings; only the distinct values are parsed"""
+        codes, uniques = pd.factorize(values)
+        kinds = np.full(len(uniques), OTHER, dtype=np.int8)
+        numbers = [0] * len(uniques)
+        other = []
+        for number, text in enumerate(uniques):
+            try:
+                address = ipaddress.ip_address(text) if isinstance(text, str) else None
+            except ValueError:
+                address = None
+            if address is not None and str(address) == text:
+                kinds[number] = address.version
+                numbers[number] = int(address)
+            else:
+                numbers[number] = len(other)
+                other.append(text)
+
+        found = codes >= 0
+        row_kinds = np.full(len(codes), MISSING, dtype=np.int8)
+        row_kinds[found] = kinds[codes[found]]
+        if (kinds == IPV6).any():
+            low = np.array([value & _LOW_MASK for value in numbers], dtype=np.uint64)
+            high = np.array([value >> 64 for value in numbers], dtype=np.uint64)
+            row_high = np.zeros(len(codes), dtype=np.uint64)
+            row_high[found] = high[codes[found]]
+        else:
+            low = np.array(numbers, dtype=np.uint32)
+            row_high = None
+        row_low = np.zeros(len(codes), dtype=low.dtype)
+        row_low[found] = low[codes[found]]
+        return cls(row_kinds, row_low, row_high, other)
+
+    @classmethod
+    def pack_column(cls, data, column):
+        """replace the text column of `data` (in place) by its packed form, restored later by `restore`"""
+        packed = cls.from_text(data[column])
+        packed.column = column
+        packed.file_columns = list(data.columns)
+        data.drop(columns=column, inplace=True)
+        return packed
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def nbytes(self):
+        return self.kinds.nbytes + self.low.nbytes + (self.high.nbytes if self.high is not None else 0)
+
+    def keys(self, positions=None):
+        """
+        int64 key of every row (of the rows at `positions`) for key_encoding (dedup, unique counts, joins);
+        -1 where missing. With IPv6 the keys are dense codes, so only keys of the same call can be compared.
+        """
+        kinds, low = self.kinds, self.low
+        high = self.high
+        if positions is not None:
+            kinds, low = kinds[positions], low[positions]
+            high = high[positions] if high is not None else None
+        if high is None:
+            keys = low.astype(np.int64)
+            # Text values are numbered after the 2**32 IPv4 addresses.
+            keys[kinds == OTHER] += 1 << 32
+        else:
+            keys = key_encoding.encode_keys(kinds, high, low)
+        keys[kinds == MISSING] = -1
+        return keys
+
+    def to_text(self, positions=None):
+        """address text of the rows at `positions` (all rows by default), NaN where missing"""
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions)
+        keys = self.keys(positions)
+        # Format each distinct address once.
+        distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        texts = np.array([self._format(positions[row]) for row in first], dtype=object)
+        return texts[inverse.reshape(-1)] if len(positions) else np.zeros(0, dtype=object)
+
+    def _format(self, row):
+        kind = self.kinds[row]
+        if kind == MISSING:
+            return np.nan
+        if kind == OTHER:
+            return self.other[int(self.low[row])]
+        if kind == IPV4:
+            return str(ipaddress.IPv4Address(int(self.low[row])))
+        return str(ipaddress.IPv6Address((int(self.high[row]) << 64) | int(self.low[row])))
+
+    def restore(self, data):
+        """
+        put the text column back for the rows of `data` (index = row positions of the packed column), at
+        its original column position
+        """
+        values = pd.Series(self.to_text(data.index.to_numpy()), index=data.index, dtype=object)
+        if self.column in data.columns:
+            data[self.column] = values
+            return data
+        present = [name for name in self.file_columns[:self.file_columns.index(self.column)] if name in data.columns]
+        data.insert(data.columns.get_loc(present[-1]) + 1 if present else 0, self.column, values)
+        return data
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+CVE_PATTERN = r'CVE-\d{4}-\d{4,}\b'
+KEV_KEY_COLUMN = 'cveID'
+# Optional KEV attributes that can be copied onto matched rows, as KEV column: output column.
+KEV_ATTRIBUTE_COLUMNS = {
+    'dateAdded': 'CisaKev Date Added',
+    'dueDate': 'CisaKev Due Date',
+    'knownRansomwareCampaignUse': 'CisaKev Ransomware Use',
+}
+MAPPED_INDEX_VERSION = 1
+# Superseded index versions are kept this long after a refresh, for readers that resolved them just before.
+STALE_INDEX_SECONDS = 3600
+
+
+def normalize_cves(values):
+    """upper-case, trimmed CVE IDs"""
+    return pd.Series(values, dtype=object).astype(str).str.strip().str.upper()
+
+
+def tokenize_cves(cells):
+    """
+    All CVE IDs of every cell, as (cell number, CVE ID) pairs in the order they appear in the cell.
+    Cells such as 'CVE-2021-1234, cve-2021-1235' hold several IDs; anything that is not a CVE ID is ignored.
+    """
+    tokens = normalize_cves(cells).str.findall(CVE_PATTERN).explode().dropna()
+    return tokens.index.to_numpy(dtype=np.int64), tokens.to_numpy(dtype=object)
+
+
+class KevMatcher(ABC):
+    """
+    Matching of multi-CVE cells against a KEV catalog; subclasses provide `lookup` and `attribute_values`.
+
+    `match` looks up every CVE of a multi-CVE cell in bulk. Cells are factorized first, so the tokenizing
+    and the lookups run once per distinct cell value and the result is mapped back to the rows by code.
+    """
+
+    @abstractmethod
+    def lookup(self, cves):
+        """catalog row of every (normalized) CVE ID, -1 when it is not in the catalog"""
+
+    @abstractmethod
+    def attribute_values(self, column, rows):
+        """values of a KEV column for catalog rows, missing where the row is -1"""
+
+    def match_rows(self, cells):
+        """catalog row of the first KEV-listed CVE in every cell, -1 when none is listed"""
+        codes, uniques = pd.factorize(cells)
+        cell_numbers, cves = tokenize_cves(np.asarray(uniques, dtype=object))
+        catalog_rows = self.lookup(cves)
+        matched = catalog_rows >= 0
+        best = np.full(len(uniques), -1, dtype=np.int64)
+        # Tokens are in cell order, so the first token of each cell that is in the catalog wins.
+        matched_cells, first_token = np.unique(cell_numbers[matched], return_index=True)
+        best[matched_cells] = catalog_rows[matched][first_token]
+        return np.where(codes >= 0, best[codes], -1) if len(best) else np.full(len(codes), -1, dtype=np.int64)
+
+    def match(self, cells, attributes=None):
+        """
+        DataFrame aligned with `cells` holding the 'CisaKev' flag and, optionally, KEV attributes
+        (a list of KEV columns, or a {KEV column: output column} mapping).
+        """
+        rows = self.match_rows(cells)
+        index = cells.index if isinstance(cells, pd.Series) else None
+        result = pd.DataFrame({'CisaKev': rows >= 0}, index=index)
+        if attributes:
+            if not isinstance(attributes, dict):
+                attributes = {column: KEV_ATTRIBUTE_COLUMNS.get(column, f'CisaKev {column}') for column in attributes}
+            for column, output_column in attributes.items():
+                result[output_column] = pd.Series(self.attribute_values(column, rows), index=index)
+        return result
+
+
+class KevIndex(KevMatcher):
+    """In-memory hash index of a KEV catalog DataFrame, keyed by normalized CVE ID."""
+
+    def __init__(self, cisa_kev_df, key_column=KEV_KEY_COLUMN):
+        keys = normalize_cves(cisa_kev_df[key_column])
+        # One entry per CVE: the first occurrence in the catalog wins.
+        first = ~keys.duplicated().to_numpy()
+        self.keys = pd.Index(keys.to_numpy()[first])
+        self.attributes = cisa_kev_df.iloc[np.flatnonzero(first)].reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, cves):
+        return self.keys.get_indexer(cves)
+
+    def attribute_values(self, column, rows):
+        return self.attributes[column].array.take(rows, allow_fill=True)
+
+
+def write_mapped_kev_index(cisa_kev_df, index_path, attributes=None, key_column=KEV_KEY_COLUMN):
+    """
+    Save a KEV catalog in the memory-mappable index format: sorted fixed-width CVE keys (keys.npy) and
+    one fixed-width column per attribute, aligned with the keys. `index_path` is a symlink to the current
+    version folder and is swapped atomically.
+    """
+    index = KevIndex(cisa_kev_df, key_column)
+    keys = _encode_fixed_width(index.keys.to_numpy())
+    order = np.argsort(keys, kind='stable')
+    columns = {'keys': keys[order]}
+    for column in attributes or [column for column in KEV_ATTRIBUTE_COLUMNS if column in cisa_kev_df.columns]:
+        columns[column] = _encode_fixed_width(index.attributes[column].fillna('').to_numpy())[order]
+
+    # Every refresh writes a new version folder next to `index_path` and then points the `index_path`
+    # symlink at it with an atomic rename, so concurrent jobs can refresh and read the index at the same time
+    # and readers always see a complete version.
+    parent, name = os.path.split(os.path.abspath(index_path))
+    os.makedirs(parent, exist_ok=True)
+    version_path = tempfile.mkdtemp(dir=parent, prefix=f'{name}.v')
+    for column, values in columns.items():
+        np.save(os.path.join(version_path, f'{column}.npy'), values)
+    with open(os.path.join(version_path, 'metadata.json'), 'w') as file:
+        json.dump({'version': MAPPED_INDEX_VERSION, 'rows': len(order), 'attributes': list(columns)[1:]}, file, indent=2)
+    os.chmod(version_path, 0o755)
+
+    if os.path.isdir(index_path) and not os.path.islink(index_path):
+        # Index folder of an older release: moved aside once, the symlink takes its place below.
+        try:
+            os.rename(index_path, tempfile.mkdtemp(dir=parent, prefix=f'{name}.v'))
+        except OSError:
+            pass  # moved by a concurrent refresh
+    previous_path = os.path.realpath(index_path) if os.path.islink(index_path) else None
+    link_path = os.path.join(tempfile.mkdtemp(dir=parent, prefix=f'{name}.link'), name)
+    os.symlink(os.path.basename(version_path), link_path)
+    os.replace(link_path, index_path)
+    os.rmdir(os.path.dirname(link_path))
+    if previous_path and os.path.isdir(previous_path):
+        # The grace period of the superseded version starts now.
+        os.utime(previous_path)
+    _remove_stale_versions(parent, name, os.path.realpath(index_path))
+    return index_path
+
+
+def _remove_stale_versions(parent, name, current_path):
+    """remove index versions (and leftovers of failed refreshes) superseded for over STALE_INDEX_SECONDS"""
+    for entry in os.scandir(parent):
+        if not entry.name.startswith((f'{name}.v', f'{name}.link')) or entry.path == current_path:
+            continue
+        try:
+            if time.time() - entry.stat(follow_symlinks=False).st_mtime > STALE_INDEX_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            pass  # removed by a concurrent refresh
+
+
+class MappedKevIndex(KevMatcher):
+    """
+    KEV index memory-mapped from the files of `write_mapped_kev_index`.
+
+    Opening it only maps the files, so it costs next to nothing, and every process that maps the same
+    index shares one copy in the page cache. CVE IDs are found by binary search on the sorted keys.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        # The index folder is a symlink that a refresh can swap at any time: it is resolved once and every
+        # file is mapped right away, so all of them come from the same version.
+        version_path = os.path.realpath(index_path)
+        with open(os.path.join(version_path, 'metadata.json'), 'r') as file:
+            self.metadata = json.load(file)
+        if self.metadata.get('version') != MAPPED_INDEX_VERSION:
+            raise ValueError(f"Unsupported KEV index version in {index_path}: {self.metadata.get('version')}")
+        self.keys = np.load(os.path.join(version_path, 'keys.npy'), mmap_mode='r')
+        self.attribute_names = self.metadata['attributes']
+        self._attributes = {column: np.load(os.path.join(version_path, f'{column}.npy'), mmap_mode='r')
+                            for column in self.attribute_names}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, cves):
+        if not len(cves) or not len(self.keys):
+            return np.full(len(cves), -1, dtype=np.int64)
+        cves = _encode_fixed_width(np.asarray(cves, dtype=object))
+        # IDs longer than the widest key cannot be in the index (and would be truncated by the cast).
+        fits = np.char.str_len(cves) <= self.keys.dtype.itemsize
+        cves = cves.astype(self.keys.dtype)
+        positions = np.minimum(np.searchsorted(self.keys, cves), len(self.keys) - 1)
+        return np.where(fits & (self.keys[positions] == cves), positions, -1)
+
+    def attribute_values(self, column, rows):
+        if column not in self._attributes:
+            raise KeyError(f"KEV index {self.index_path} has no attribute '{column}'")
+        values = np.full(len(rows), np.nan, dtype=object)
+        found = rows >= 0
+        if found.any():
+            values[found] = np.char.decode(self._attributes[column][rows[found]], 'utf-8')
+            # Empty attributes were missing in the catalog.
+            values[found & (values == '')] = np.nan
+        return values
+
+
+def _encode_fixed_width(values):
+    """UTF-8 encoded fixed-width bytes array (at least 1 byte wide)"""
+    encoded = np.char.encode(np.asarray(values, dtype=str), 'utf-8')
+    return encoded.astype(f'S{max(encoded.dtype.itemsize, 1)}')
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Integer encoding of the text keys (asset names, IP addresses, vulnerability IDs). Dedup, unique counts
+# and joins run on the integer codes; the strings are only looked up again for display columns.
+# Missing values get the code -1.
+
+
+def encode_keys(*columns):
+    """dense int64 codes (0..n-1 in order of first appearance) for one key column or a combination of them"""
+    codes, _ = _factorize_columns(columns)
+    return codes
+
+
+def encode_labels(*columns, separator=' '):
+    """
+    Categorical of the key columns joined by `separator`, e.g. asset name + vulnerability ID.
+    The label strings are only built once per distinct combination, not once per row.
+    """
+    codes, parts = _factorize_columns(columns)
+    if not len(parts[0]):
+        return pd.Categorical.from_codes(codes, categories=pd.Index([], dtype=object))
+    labels = parts[0].astype(str)
+    for part in parts[1:]:
+        labels = labels + separator + part.astype(str)
+    # Different combinations can still join to the same text, e.g. 'a b' + 'c' and 'a' + 'b c'.
+    label_codes, categories = pd.factorize(labels)
+    return pd.Categorical.from_codes(np.where(codes >= 0, label_codes[codes], -1), categories=categories)
+
+
+def hash_keys(data, columns):
+    """64-bit hash of the key columns of every row; unlike the codes it is stable across files and runs"""
+    return pd.util.hash_pandas_object(data[columns], index=False).to_numpy()
+
+
+def first_occurrence(codes):
+    """boolean mask of the first row of every key, the integer equivalent of ~duplicated(keep='first')"""
+    # Hash-based on the integers, O(n) instead of sorting them.
+    return ~pd.Series(np.asarray(codes), copy=False).duplicated().to_numpy()
+
+
+def drop_duplicate_keys(data, codes):
+    """rows of `data` with the first occurrence of every key; `codes` is aligned with the rows of `data`"""
+    return data[first_occurrence(codes)]
+
+
+def _factorize_columns(columns):
+    """combined codes of the key columns, plus the value of every column for each distinct combination"""
+    factorized = [pd.factorize(column) for column in columns]
+    if len(factorized) == 1:
+        return factorized[0][0].astype(np.int64), [pd.Index(factorized[0][1])]
+    # Mixed-radix combination of the per-column codes, renumbered densely.
+    combined = np.zeros(len(factorized[0][0]), dtype=np.int64)
+    missing = np.zeros(len(combined), dtype=bool)
+    for column_codes, uniques in factorized:
+        missing |= column_codes < 0
+        combined = combined * len(uniques) + column_codes
+    codes = np.full(len(combined), -1, dtype=np.int64)
+    codes[~missing], distinct = pd.factorize(combined[~missing])
+    parts = []
+    remainder = np.asarray(distinct, dtype=np.int64)
+    for _, uniques in reversed(factorized):
+        parts.append(pd.Index(uniques).take(remainder % len(uniques)))
+        remainder = remainder // len(uniques)
+    return codes, parts[::-1]
@@ -0,0 +1,167 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Column types of the Nexpose vulnerability exports, shared by hi_report and VulnerabilityReportProcessor.
+# Low-cardinality text (OS, location, titles, IDs, ages) is loaded as categoricals: every distinct value is
+# stored once and rows only hold an integer code. Free text that is unique per row stays a plain string.
+CATEGORY_COLUMNS = [
+    'Asset IP Address',
+    'Asset Names',
+    'Asset Location',
+    'Asset OS Family',
+    'Asset OS Name',
+    'Asset OS Version',
+    'Vulnerability Title',
+    'Vulnerability CVE IDs',
+    'Vulnerability ID',
+    'Vulnerability Age',
+]
+STRING_COLUMNS = [
+    'Vulnerability Description',
+    'Vulnerability Proof',
+    'Vulnerability Solution',
+]
+FLOAT_COLUMNS = [
+    'Vulnerability CVSS Score',
+    'Vulnerability CVSSv3 Score',
+    'Vulnerability CVSSv2 Score',
+]
+# Columns added during processing that are categorical too (see vulnerability_transforms).
+DERIVED_CATEGORY_COLUMNS = ['Unique Vulnerability ID']
+# Parsed after loading: the risk score has thousands separators, the dates are Nexpose timestamps.
+NUMERIC_TEXT_COLUMNS = ['Vulnerability Risk Score']
+DATE_COLUMNS = ['Vulnerable Since', 'Vulnerability Test Date']
+
+TEXT_COLUMNS = CATEGORY_COLUMNS + STRING_COLUMNS
+
+# Timestamp layouts seen in Nexpose exports, tried in order against a sample of each file.
+DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+    '%m/%d/%Y %I:%M:%S %p',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+]
+DATE_SAMPLE_SIZE = 200
+
+
+class DateParser:
+    """
+    Parse the report timestamp columns with an explicit format.
+
+    The format of every column is detected once, on a sample of the first batch that has values, and reused
+    for the following batches of the same file. Only distinct values are parsed. Values that do not match
+    it are parsed again as ISO 8601, since exports mix whole-second and fractional-second timestamps in one
+    column. Values that still do not parse become NaT and are counted in `invalid_counts`, instead of
+    leaving the whole column as strings.
+    """
+
+    def __init__(self):
+        self.formats = {}
+        self.invalid_counts = {}
+
+    def detect_format(self, values):
+        """known format that parses most of the sampled values, or None to let pandas infer it"""
+        sample = pd.Series(values[:DATE_SAMPLE_SIZE], dtype=object)
+        best_format, best_count = None, 0
+        for date_format in DATE_FORMATS:
+            parsed_count = pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum()
+            if parsed_count > best_count:
+                best_format, best_count = date_format, parsed_count
+            if best_count == len(sample):
+                break
+        return best_format
+
+    def parse(self, column, series):
+        """parse one date column (or a batch of it) to datetime64"""
+        codes, uniques = pd.factorize(series)
+        values = pd.Series(uniques, dtype=object).astype(str).str.strip()
+        non_empty = (values != '').to_numpy()
+        if column not in self.formats and non_empty.any():
+            self.formats[column] = self.detect_format(values[non_empty].to_numpy())
+        parsed = pd.Series(pd.to_datetime(values, format=self.formats.get(column), errors='coerce'))
+        retry = (parsed.isna() & non_empty).to_numpy()
+        if retry.any():
+            # utc=True so values with and without an offset parse together; stored as naive UTC like the rest.
+            parsed[retry] = pd.to_datetime(values[retry], format='ISO8601', errors='coerce', utc=True).dt.tz_localize(None)
+        parsed = pd.DatetimeIndex(parsed)
+
+        # Rows holding a non-empty value that could not be parsed.
+        invalid_values = np.asarray(parsed.isna()) & non_empty
+        rows_per_value = np.bincount(codes[codes >= 0], minlength=len(values))
+        self.invalid_counts[column] = self.invalid_counts.get(column, 0) + int(rows_per_value[invalid_values].sum())
+
+        return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=series.index)
+
+
+def read_dtypes():
+    """dtype mapping for pd.read_csv"""
+    dtypes = {column: 'category' for column in CATEGORY_COLUMNS}
+    dtypes.update({column: 'str' for column in STRING_COLUMNS + NUMERIC_TEXT_COLUMNS + DATE_COLUMNS})
+    dtypes.update({column: np.float64 for column in FLOAT_COLUMNS})
+    return dtypes
+
+
+def fill_missing_text(data):
+    """replace missing values with '' in the text columns only, so numeric and date columns keep their dtype"""
+    for column in TEXT_COLUMNS:
+        if column not in data.columns:
+            continue
+        if isinstance(data[column].dtype, pd.CategoricalDtype):
+            if not data[column].hasnans:
+                continue
+            if '' not in data[column].cat.categories:
+                data[column] = data[column].cat.add_categories('')
+        data[column] = data[column].fillna('')
+    return data
+
+
+def apply_schema(data, date_parser=None):
+    """convert a freshly loaded report (or batch of it) to the registry types"""
+    date_parser = date_parser or DateParser()
+    fill_missing_text(data)
+    for column in NUMERIC_TEXT_COLUMNS:
+        if column in data.columns:
+            # Convert removing commas and converting to float; anything else that is not a number becomes NaN.
+            data[column] = pd.to_numeric(data[column].str.replace(',', '', regex=False), errors='coerce')
+    for column in DATE_COLUMNS:
+        if column in data.columns:
+            # Convert date fields from string to datetime.
+            data[column] = date_parser.parse(column, data[column])
+    return data
+
+
+def restore_categoricals(data):
+    """re-apply categorical dtypes, e.g. after concatenating batches whose categories differ"""
+    for column in CATEGORY_COLUMNS + DERIVED_CATEGORY_COLUMNS:
+        if column in data.columns and not isinstance(data[column].dtype, pd.CategoricalDtype):
+            data[column] = data[column].astype('category')
+    return data
+
+
+def column_memory(data):
+    """deep memory usage per column in MB"""
+    return (data.memory_usage(index=False, deep=True) / (1024 * 1024)).round(2)
+
+
+def compare_memory(file_path):
+    """per-column memory of a report loaded the previous way (all text as object) and with the registry"""
+    legacy = pd.read_csv(file_path, dtype={column: 'str' for column in TEXT_COLUMNS + NUMERIC_TEXT_COLUMNS + DATE_COLUMNS},
+                         low_memory=False)
+    legacy.fillna('', inplace=True)
+    typed = apply_schema(pd.read_csv(file_path, dtype=read_dtypes(), low_memory=False))
+    comparison = pd.DataFrame({'before_mb': column_memory(legacy), 'after_mb': column_memory(typed),
+                               'dtype': typed.dtypes.astype(str)})
+    comparison.loc['Total'] = [comparison['before_mb'].sum(), comparison['after_mb'].sum(), '']
+    return comparison
+
+
+if __name__ == "__main__":
+    print(compare_memory(sys.argv[1]).to_string())
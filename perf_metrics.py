@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import inspect
+import functools
+import threading
+import pandas as pd
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is then not recorded
+    resource = None
+
+
+def peak_rss_mb():
+    """high-water mark of the resident set size of this process, in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def count_rows(value):
+    return len(value.index) if isinstance(value, pd.DataFrame) else None
+
+
+class PerfMetrics:
+    """
+    Per-method performance counters collected by `record_performance`.
+
+    Every call adds its wall time, CPU time, peak RSS growth and DataFrame rows in/out to the totals
+    of its stage ('Class.method'). At the end of a run `write` exports the totals as a JSON summary
+    and as a Prometheus textfile (for the node_exporter textfile collector).
+
+    CPU time is that of the calling thread, so stages running concurrently on a thread pool do not count
+    each other's work (and work a method hands to other threads is not counted). The peak RSS is only
+    known for the whole process: with concurrent stages the growth is that of all of them together.
+    """
+
+    def __init__(self, job='mani'):
+        self.job = job
+        self.started_at = datetime.now()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, wall_seconds, cpu_seconds, rss_delta_mb=None, rows_in=None, rows_out=None):
+        with self._lock:
+            totals = self.stages.setdefault(stage, {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_delta_mb': None,
+                'rows_in': None, 'rows_out': None,
+            })
+            totals['calls'] += 1
+            totals['wall_seconds'] += wall_seconds
+            totals['cpu_seconds'] += cpu_seconds
+            if rss_delta_mb is not None:
+                totals['peak_rss_delta_mb'] = max(totals['peak_rss_delta_mb'] or 0.0, rss_delta_mb)
+            for key, rows in (('rows_in', rows_in), ('rows_out', rows_out)):
+                if rows is not None:
+                    totals[key] = (totals[key] or 0) + rows
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def merge(self, stages):
+        """add the stage totals of another recorder, e.g. `summary()['stages']` of a worker process"""
+        with self._lock:
+            for stage, other in stages.items():
+                totals = self.stages.setdefault(stage, {
+                    'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_delta_mb': None,
+                    'rows_in': None, 'rows_out': None,
+                })
+                for key in ('calls', 'wall_seconds', 'cpu_seconds'):
+                    totals[key] += other[key]
+                if other['peak_rss_delta_mb'] is not None:
+                    totals['peak_rss_delta_mb'] = max(totals['peak_rss_delta_mb'] or 0.0, other['peak_rss_delta_mb'])
+                for key in ('rows_in', 'rows_out'):
+                    if other[key] is not None:
+                        totals[key] = (totals[key] or 0) + other[key]
+
+    def summary(self):
+        with self._lock:
+            stages = {stage: dict(totals, wall_seconds=round(totals['wall_seconds'], 4),
+                                  cpu_seconds=round(totals['cpu_seconds'], 4))
+                      for stage, totals in self.stages.items()}
+        peak_rss = peak_rss_mb()
+        return {
+            'job': self.job,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+            'stages': stages,
+        }
+
+    def prometheus_text(self, summary=None):
+        summary = summary or self.summary()
+        lines = []
+        metrics = [
+            ('calls', 'mani_stage_calls_total', 'counter', 'Number of calls of the stage.'),
+            ('wall_seconds', 'mani_stage_wall_seconds', 'gauge', 'Total wall time spent in the stage.'),
+            ('cpu_seconds', 'mani_stage_cpu_seconds', 'gauge', 'Total CPU time spent in the stage.'),
+            ('peak_rss_delta_mb', 'mani_stage_peak_rss_delta_megabytes', 'gauge', 'Largest growth of the peak RSS during one call.'),
+            ('rows_in', 'mani_stage_rows_in', 'gauge', 'DataFrame rows going into the stage.'),
+            ('rows_out', 'mani_stage_rows_out', 'gauge', 'DataFrame rows coming out of the stage.'),
+        ]
+        for key, name, metric_type, description in metrics:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for stage, totals in summary['stages'].items():
+                if totals[key] is not None:
+                    lines.append(f'{name}{{pipeline="{summary["job"]}",stage="{stage}"}} {totals[key]}')
+        if summary['peak_rss_mb'] is not None:
+            lines.append('# HELP mani_peak_rss_megabytes Peak resident set size of the run.')
+            lines.append('# TYPE mani_peak_rss_megabytes gauge')
+            lines.append(f'mani_peak_rss_megabytes{{pipeline="{summary["job"]}"}} {summary["peak_rss_mb"]}')
+        lines.append('# HELP mani_run_finished_timestamp_seconds Unix time the metrics were written.')
+        lines.append('# TYPE mani_run_finished_timestamp_seconds gauge')
+        lines.append(f'mani_run_finished_timestamp_seconds{{pipeline="{summary["job"]}"}} {int(time.time())}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path, prometheus_path=None):
+        """write the JSON summary and, optionally, the Prometheus textfile; both files are replaced atomically"""
+        summary = self.summary()
+        self._write_file(json_path, json.dumps(summary, indent=2))
+        if prometheus_path:
+            self._write_file(prometheus_path, self.prometheus_text(summary))
+        return summary
+
+    def _write_file(self, file_path, content):
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path + '.tmp', 'w') as file:
+            file.write(content)
+        os.replace(file_path + '.tmp', file_path)
+
+
+# Shared by every decorated class of a run.
+metrics = PerfMetrics()
+
+
+def record_performance(recorder=None):
+    """
+    Class decorator that records wall time, CPU time, peak RSS growth and DataFrame rows in/out of every
+    method defined on the class. Rows in are taken from the first positional DataFrame argument, otherwise from
+    `self.data`; rows out from a returned DataFrame, otherwise from `self.data`.
+    Generator methods are timed while they run (every `next`), not while the consumer works on what they
+    yield; their rows out are the rows of the DataFrames they yield.
+    """
+    def decorator(cls):
+        for name, method in list(vars(cls).items()):
+            if inspect.isfunction(method) and (not name.startswith('__') or name == '__init__'):
+                timed = _timed_generator if inspect.isgeneratorfunction(method) else _timed
+                setattr(cls, name, timed(method, f'{cls.__name__}.{name}', recorder))
+        return cls
+    return decorator
+
+
+def _rows_in(self, args):
+    frames = [value for value in args if isinstance(value, pd.DataFrame)]
+    return count_rows(frames[0]) if frames else count_rows(getattr(self, 'data', None))
+
+
+def _timed(method, stage, recorder):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        rows_in = _rows_in(self, args)
+        rss_before = peak_rss_mb()
+        wall_started, cpu_started = time.perf_counter(), time.thread_time()
+        result = method(self, *args, **kwargs)
+        wall, cpu = time.perf_counter() - wall_started, time.thread_time() - cpu_started
+        rows_out = count_rows(result)
+        if rows_out is None:
+            rows_out = count_rows(getattr(self, 'data', None))
+        rss_after = peak_rss_mb()
+        rss_delta = round(rss_after - rss_before, 1) if rss_before is not None else None
+        (recorder or metrics).record(stage, wall, cpu, rss_delta, rows_in, rows_out)
+        return result
+    return wrapper
+
+
+def _timed_generator(method, stage, recorder):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        rows_in = _rows_in(self, args)
+        rss_before = peak_rss_mb()
+        wall = cpu = 0.0
+        rows_out = None
+        generator = method(self, *args, **kwargs)
+        try:
+            while True:
+                wall_started, cpu_started = time.perf_counter(), time.thread_time()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    break
+                finally:
+                    wall += time.perf_counter() - wall_started
+                    cpu += time.thread_time() - cpu_started
+                rows = count_rows(item)
+                if rows is not None:
+                    rows_out = (rows_out or 0) + rows
+                yield item
+        finally:
+            generator.close()
+            rss_after = peak_rss_mb()
+            rss_delta = round(rss_after - rss_before, 1) if rss_before is not None else None
+            (recorder or metrics).record(stage, wall, cpu, rss_delta, rows_in, rows_out)
+    return wrapper
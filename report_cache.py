@@ -0,0 +1,97 @@
+import os
+import json
+import shutil
+import pandas as pd
+from datetime import datetime
+
+
+class ReportCache:
+    """
+    Local cache of downloaded reports, keyed by report ID.
+
+    Every entry keeps the HTTP validators (ETag / Last-Modified) and the content hash of the last
+    downloaded file, plus a snapshot of the parsed, typed data as a series of pickled batches. When the
+    upstream report has not changed, the snapshot is read back instead of downloading and parsing the CSV.
+    """
+
+    METADATA_FILE = 'metadata.json'
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        os.makedirs(self.cache_path, exist_ok=True)
+
+    def entry_path(self, report_id):
+        return os.path.join(self.cache_path, str(report_id))
+
+    def load_metadata(self, report_id):
+        """metadata of the cached entry, or an empty dict when there is no complete snapshot"""
+        metadata_path = os.path.join(self.entry_path(report_id), self.METADATA_FILE)
+        if not os.path.exists(metadata_path):
+            return {}
+        try:
+            with open(metadata_path, 'r') as file:
+                metadata = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        parts = [self._part_path(report_id, number) for number in range(metadata.get('snapshot_parts', 0))]
+        if not parts or not all(os.path.exists(part) for part in parts):
+            return {}
+        return metadata
+
+    def conditional_headers(self, metadata):
+        """If-None-Match / If-Modified-Since headers for a conditional GET"""
+        headers = {}
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+        return headers
+
+    def read_snapshot(self, report_id, metadata):
+        """yield the cached typed batches in their original order"""
+        for number in range(metadata['snapshot_parts']):
+            yield pd.read_pickle(self._part_path(report_id, number))
+
+    def update_validators(self, report_id, metadata, download_info):
+        """store new ETag / Last-Modified values for an unchanged snapshot"""
+        metadata = dict(metadata, etag=download_info.get('etag'), last_modified=download_info.get('last_modified'),
+                        checked_at=datetime.now().isoformat(timespec='seconds'))
+        self._write_metadata(self.entry_path(report_id), metadata)
+        return metadata
+
+    def write_snapshot(self, report_id, batches, download_info):
+        """
+        Pickle every batch into a new snapshot while passing it through to the caller.
+        The snapshot only replaces the previous one once all batches were written.
+        """
+        final_path = self.entry_path(report_id)
+        temp_path = final_path + '.tmp'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+
+        parts = 0
+        for batch in batches:
+            batch.to_pickle(os.path.join(temp_path, f'part-{parts:05d}.pkl'))
+            parts += 1
+            yield batch
+
+        self._write_metadata(temp_path, {
+            'report_id': str(report_id),
+            'etag': download_info.get('etag'),
+            'last_modified': download_info.get('last_modified'),
+            'content_hash': download_info.get('content_hash'),
+            'bytes': download_info.get('bytes'),
+            'snapshot_parts': parts,
+            'cached_at': datetime.now().isoformat(timespec='seconds'),
+        })
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(temp_path, final_path)
+
+    def _part_path(self, report_id, number):
+        return os.path.join(self.entry_path(report_id), f'part-{number:05d}.pkl')
+
+    def _write_metadata(self, entry_path, metadata):
+        metadata_path = os.path.join(entry_path, self.METADATA_FILE)
+        with open(metadata_path + '.tmp', 'w') as file:
+            json.dump(metadata, file, indent=2)
+        os.replace(metadata_path + '.tmp', metadata_path)
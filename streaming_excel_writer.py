@@ -0,0 +1,75 @@
+import xlsxwriter
+
+
+class StreamingExcelWriter:
+    """
+    Write DataFrames to an xlsx workbook in constant memory.
+
+    Rows are streamed straight into the worksheet XML with xlsxwriter's `constant_memory` mode, one
+    sheet after another, so memory use does not grow with the number of rows. Because of that a sheet
+    has to be written completely before the next one is started.
+    """
+
+    def __init__(self, file_path, column_formats=None, header_format=None, column_widths=None,
+                 date_format='yyyy-mm-dd hh:mm:ss', batch_rows=50000):
+        """
+        :param file_path: Path of the xlsx file to create.
+        :param column_formats: Mapping of column name to xlsxwriter format properties, e.g. {'Score': {'num_format': '0.0'}}.
+        :param header_format: xlsxwriter format properties for the header row.
+        :param column_widths: Mapping of column name to column width.
+        :param date_format: Number format used for datetime cells.
+        :param batch_rows: Number of rows converted to Python values at a time.
+        """
+        self.file_path = file_path
+        self.batch_rows = batch_rows
+        self.workbook = xlsxwriter.Workbook(file_path, {
+            'constant_memory': True,
+            'default_date_format': date_format,
+            'remove_timezone': True,
+            'strings_to_numbers': False,
+            'strings_to_formulas': False,
+            'strings_to_urls': False,
+        })
+        self.header_format = self.workbook.add_format(header_format or {'bold': True})
+        self.column_formats = {column: self.workbook.add_format(properties)
+                               for column, properties in (column_formats or {}).items()}
+        self.column_widths = column_widths or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_sheet(self, sheet_name, data):
+        """Write the header and all rows of `data` into a new sheet."""
+        worksheet = self.workbook.add_worksheet(sheet_name)
+        columns = [str(column) for column in data.columns]
+
+        # Column formats have to be set before any cell is written in constant memory mode.
+        for col_idx, column in enumerate(columns):
+            column_format = self.column_formats.get(column)
+            width = self.column_widths.get(column)
+            if column_format is not None or width is not None:
+                worksheet.set_column(col_idx, col_idx, width, column_format)
+
+        worksheet.write_row(0, 0, columns, self.header_format)
+        worksheet.freeze_panes(1, 0)
+
+        row_idx = 1
+        for start in range(0, len(data.index), self.batch_rows):
+            for values in self._batch_rows(data.iloc[start:start + self.batch_rows]):
+                worksheet.write_row(row_idx, 0, values)
+                row_idx += 1
+        return row_idx - 1
+
+    def _batch_rows(self, batch):
+        # Convert a batch column by column to Python values; missing values become None (blank cells).
+        column_values = []
+        for _, series in batch.items():
+            column_values.append(series.astype(object).where(series.notna(), None).tolist())
+        return zip(*column_values)
+
+    def close(self):
+        self.workbook.close()
+
@@ -0,0 +1,176 @@
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# Column set of the Nexpose vulnerability exports processed by hi_report and VulnerabilityReportProcessor.
+REPORT_COLUMNS = [
+    'Asset IP Address',
+    'Asset Names',
+    'Asset Location',
+    'Asset OS Family',
+    'Asset OS Name',
+    'Asset OS Version',
+    'Vulnerability Title',
+    'Vulnerability CVE IDs',
+    'Vulnerability CVSSv3 Score',
+    'Vulnerability CVSS Score',
+    'Vulnerability CVSSv2 Score',
+    'Vulnerability Risk Score',
+    'Vulnerability Description',
+    'Vulnerability Proof',
+    'Vulnerability Solution',
+    'Vulnerability Age',
+    'Vulnerable Since',
+    'Vulnerability Test Date',
+    'Vulnerability ID',
+    'Service Port',
+]
+KEV_COLUMNS = ['cveID', 'vendorProject', 'product', 'vulnerabilityName', 'dateAdded', 'shortDescription',
+               'requiredAction', 'dueDate', 'knownRansomwareCampaignUse', 'notes', 'cwes']
+
+OPERATING_SYSTEMS = [
+    # (family, name, versions, weight)
+    ('Windows', 'Microsoft Windows Server 2019 Standard Edition', ['1809', '17763'], 0.22),
+    ('Windows', 'Microsoft Windows Server 2016 Standard Edition', ['1607', '14393'], 0.14),
+    ('Windows', 'Microsoft Windows 10 Enterprise Edition', ['21H2', '22H2'], 0.24),
+    ('Windows', 'Microsoft Windows 11 Enterprise Edition', ['22H2', '23H2'], 0.08),
+    ('Linux', 'Red Hat Enterprise Linux', ['7.9', '8.6', '8.8'], 0.14),
+    ('Linux', 'Ubuntu Linux', ['18.04', '20.04', '22.04'], 0.08),
+    ('Linux', 'CentOS Linux', ['7.9'], 0.04),
+    ('', 'Cisco IOS', ['15.2', '16.9'], 0.03),
+    ('', '', [''], 0.03),
+]
+LOCATIONS = ['Farmington, CT', 'Florence, SC', 'Berlin, DE', 'Gien, FR', 'Bangalore, IN', 'Shanghai, CN',
+             'Madrid, ES', 'Tianjin, CN', 'Hyderabad, IN', 'Sao Paulo, BR', '']
+# Most frequent CVSSv3 base scores; 0 means the vulnerability has no v3 score and falls back to v2.
+CVSS_V3_SCORES = np.array([0.0, 9.8, 7.5, 8.8, 7.8, 5.3, 6.1, 5.5, 9.1, 6.5, 4.3, 7.2, 8.1, 5.9, 3.7, 10.0])
+CVSS_V3_WEIGHTS = np.array([18, 12, 14, 9, 10, 8, 5, 5, 3, 5, 3, 2, 2, 2, 1, 1], dtype=float)
+SERVICE_PORTS = np.array([0, 443, 80, 445, 3389, 22, 8443, 135, 17472, 1433, 8080])
+SERVICE_PORT_WEIGHTS = np.array([40, 18, 8, 8, 5, 5, 4, 3, 3, 3, 3], dtype=float)
+VENDORS = ['microsoft', 'apache', 'oracle', 'openssl', 'vmware', 'cisco', 'adobe', 'google', 'linux', 'jenkins']
+FALSE_POSITIVE_TITLE = 'X.509 Certificate Subject CN Does Not Match the Entity Name'
+
+
+def build_vulnerability_catalog(rng, size=4000):
+    """catalog of synthetic vulnerability definitions the report rows are drawn from"""
+    vendors = rng.choice(VENDORS, size)
+    years = rng.integers(2014, 2025, size)
+    numbers = rng.integers(1000, 50000, size)
+    cves = np.array([f'CVE-{year}-{number}' for year, number in zip(years, numbers)], dtype=object)
+    # About one in six vulnerabilities lists several CVEs in a single cell.
+    extra = rng.random(size) < 0.16
+    cves[extra] = [f'{cve}, CVE-{year}-{number + 1}' for cve, year, number in zip(cves[extra], years[extra], numbers[extra])]
+    cves[rng.random(size) < 0.08] = ''
+
+    v3 = rng.choice(CVSS_V3_SCORES, size, p=CVSS_V3_WEIGHTS / CVSS_V3_WEIGHTS.sum())
+    v2 = np.round(np.clip(np.where(v3 > 0, v3 - rng.uniform(0, 1.5, size), rng.uniform(2, 10, size)), 0, 10), 1)
+    catalog = pd.DataFrame({
+        'Vulnerability ID': [f'{vendor}-{cve.split(",")[0].lower() or "config"}-{i}' for i, (vendor, cve) in enumerate(zip(vendors, cves))],
+        'Vulnerability Title': [f'{vendor.title()}: {cve.split(",")[0] or "Insecure configuration"} vulnerability' for vendor, cve in zip(vendors, cves)],
+        'Vulnerability CVE IDs': cves,
+        'Vulnerability CVSSv3 Score': v3,
+        'Vulnerability CVSSv2 Score': v2,
+        'Vulnerability Description': [f'A flaw in {vendor} components allows a remote attacker to compromise the system. ' * int(n)
+                                      for vendor, n in zip(vendors, rng.integers(2, 8, size))],
+        'Vulnerability Solution': [f'Apply the latest {vendor} security update and restart the affected service. ' * int(n)
+                                   for vendor, n in zip(vendors, rng.integers(1, 5, size))],
+    })
+    catalog.loc[0, ['Vulnerability ID', 'Vulnerability Title', 'Vulnerability CVE IDs']] = [
+        'certificate-common-name-mismatch', FALSE_POSITIVE_TITLE, '']
+    return catalog
+
+
+def build_assets(rng, size):
+    """asset pool with address, name, location and operating system"""
+    os_weights = np.array([os_entry[3] for os_entry in OPERATING_SYSTEMS])
+    os_index = rng.choice(len(OPERATING_SYSTEMS), size, p=os_weights / os_weights.sum())
+    ip_numbers = rng.choice(2 ** 24, size, replace=False)
+    return pd.DataFrame({
+        'Asset IP Address': [f'10.{n >> 16}.{(n >> 8) & 255}.{n & 255}' for n in ip_numbers],
+        'Asset Names': [f'otis-{"srv" if OPERATING_SYSTEMS[i][1].find("Server") > 0 else "ws"}-{n:07d}.otis.com'
+                        for i, n in zip(os_index, ip_numbers)],
+        'Asset Location': rng.choice(LOCATIONS, size),
+        'Asset OS Family': [OPERATING_SYSTEMS[i][0] for i in os_index],
+        'Asset OS Name': [OPERATING_SYSTEMS[i][1] for i in os_index],
+        'Asset OS Version': [rng.choice(OPERATING_SYSTEMS[i][2]) for i in os_index],
+    })
+
+
+def generate_batch(rng, rows, assets, catalog, now):
+    """one batch of report rows; vulnerabilities follow a Zipf-like popularity curve"""
+    asset_rows = assets.iloc[rng.integers(0, len(assets), rows)].reset_index(drop=True)
+    popularity = np.minimum(rng.zipf(1.3, rows) - 1, len(catalog) - 1)
+    vulnerability_rows = catalog.iloc[popularity].reset_index(drop=True)
+    batch = pd.concat([asset_rows, vulnerability_rows], axis=1)
+
+    batch['Vulnerability CVSS Score'] = batch['Vulnerability CVSSv2 Score']
+    risk = np.round(rng.gamma(2.0, 250.0, rows) * (1 + batch['Vulnerability CVSSv3 Score'].to_numpy()), 2)
+    batch['Vulnerability Risk Score'] = [f'{value:,.2f}' for value in risk]
+
+    since_days = rng.integers(0, 1200, rows)
+    test_days = rng.integers(0, 75, rows)
+    since = pd.Series(now - pd.to_timedelta(since_days, unit='D') - pd.to_timedelta(rng.integers(0, 86400, rows), unit='s'))
+    tested = pd.Series(now - pd.to_timedelta(test_days, unit='D') - pd.to_timedelta(rng.integers(0, 86400, rows), unit='s'))
+    batch['Vulnerable Since'] = since.dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3]
+    batch['Vulnerability Test Date'] = tested.dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3]
+    batch['Vulnerability Age'] = [f'{days:,} Day' if days == 1 else f'{days:,} Days' for days in since_days]
+
+    ports = rng.choice(SERVICE_PORTS, rows, p=SERVICE_PORT_WEIGHTS / SERVICE_PORT_WEIGHTS.sum())
+    # Port 0 stands for findings that are not bound to a service; those have an empty port.
+    batch['Service Port'] = pd.Series(ports, dtype='Int64').where(ports != 0)
+    batch['Vulnerability Proof'] = ('Vulnerable software installed: ' + batch['Vulnerability ID'] + '\n * Running service on port '
+                                    + pd.Series(ports).astype(str) + ' of ' + batch['Asset Names'])
+    return batch[REPORT_COLUMNS]
+
+
+def write_report(file_path, rows, seed=42, batch_rows=500000):
+    """write a seeded synthetic Nexpose report of `rows` rows, batch by batch to bound memory"""
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(datetime.now().replace(microsecond=0))
+    catalog = build_vulnerability_catalog(rng)
+    # Roughly 40 findings per asset, as in our production exports.
+    assets = build_assets(rng, max(10, rows // 40))
+    written = 0
+    while written < rows:
+        batch = generate_batch(rng, min(batch_rows, rows - written), assets, catalog, now)
+        batch.to_csv(file_path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += len(batch.index)
+    return file_path
+
+
+def write_cisa_kev(file_path, seed=42, size=1100):
+    """write a synthetic CISA KEV catalog that overlaps with the CVEs of the synthetic reports"""
+    rng = np.random.default_rng(seed)
+    catalog = build_vulnerability_catalog(rng)
+    cves = catalog['Vulnerability CVE IDs'].str.split(', ').explode()
+    cves = cves[cves != ''].drop_duplicates()
+    cves = cves.sample(n=min(size, len(cves)), random_state=seed).reset_index(drop=True)
+    added = pd.Timestamp('2021-11-03') + pd.to_timedelta(rng.integers(0, 1000, len(cves)), unit='D')
+    kev = pd.DataFrame({
+        'cveID': cves,
+        'vendorProject': rng.choice(VENDORS, len(cves)),
+        'product': 'Product',
+        'vulnerabilityName': 'Synthetic known exploited vulnerability',
+        'dateAdded': added.strftime('%Y-%m-%d'),
+        'shortDescription': 'Synthetic entry for benchmarking.',
+        'requiredAction': 'Apply mitigations per vendor instructions or discontinue use of the product.',
+        'dueDate': (added + pd.Timedelta(days=21)).strftime('%Y-%m-%d'),
+        'knownRansomwareCampaignUse': rng.choice(['Known', 'Unknown'], len(cves), p=[0.2, 0.8]),
+        'notes': '',
+        'cwes': rng.choice(['CWE-20', 'CWE-787', 'CWE-502', ''], len(cves)),
+    })
+    kev[KEV_COLUMNS].to_csv(file_path, index=False)
+    return file_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a synthetic Nexpose vulnerability report.')
+    parser.add_argument('rows', type=int, help='number of report rows, e.g. 10000, 1000000 or 10000000')
+    parser.add_argument('file_path', help='CSV file to write')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--kev', help='also write a matching synthetic CISA KEV CSV to this path')
+    args = parser.parse_args()
+    write_report(args.file_path, args.rows, seed=args.seed)
+    if args.kev:
+        write_cisa_kev(args.kev, seed=args.seed)
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hi_report
+import synthetic_nexpose_report
+from inventory_files_config import hi_config
+
+
+def make_processor(tmp_path, stream_reports=True):
+    paths = {name: str(tmp_path / name) for name in ('input', 'output', 'merge')}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    config = dict(hi_config, paths={'input_path': paths['input'], 'output_path': paths['output'],
+                                    'merge_files_path': paths['merge']},
+                  options={'stream_reports': stream_reports, 'chunk_rows': 700,
+                           'incremental_state_path': str(tmp_path / 'state')})
+    return hi_report.VulnerabilityReportProcessor(config, download_new_reports=False)
+
+
+def days_ago_timestamp(days_ago):
+    return (pd.Timestamp.today() - pd.Timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def run_both(processor, report_path):
+    incremental, delta = processor.process_report_batches_incremental(1, processor.iter_report_file(report_path), 'r.xlsx')
+    full = processor.process_report_batches(processor.iter_report_file(report_path), 'r.xlsx')
+    normalize = lambda data: data.astype(object).where(data.notna(), '')
+    pd.testing.assert_frame_equal(normalize(incremental), normalize(full))
+    return incremental, delta
+
+
+def test_rescanned_stale_rows_are_processed_again(tmp_path):
+    report_path = str(tmp_path / 'report.csv')
+    synthetic_nexpose_report.write_report(report_path, 3000, seed=7)
+    week1 = pd.read_csv(report_path, dtype=str, keep_default_na=False)
+    # Every fifth row was last tested 60 days ago; in week 2 all of them were rescanned yesterday.
+    week1.loc[::5, 'Vulnerability Test Date'] = days_ago_timestamp(60)
+    # Two identical rows, only one of them kept in week 1.
+    week1.loc[1:2] = week1.loc[[1, 1]].to_numpy()
+    week1.loc[2, 'Vulnerability Test Date'] = days_ago_timestamp(60)
+    week1.to_csv(report_path, index=False)
+
+    for stream_reports in (True, False):
+        processor = make_processor(tmp_path / str(stream_reports), stream_reports)
+        first, _ = run_both(processor, report_path)
+
+        week2 = week1.copy()
+        week2.loc[::5, 'Vulnerability Test Date'] = days_ago_timestamp(1)
+        week2.loc[2, 'Vulnerability Test Date'] = days_ago_timestamp(1)
+        week2['Vulnerability Age'] = week2['Vulnerability Age'] + ' (week 2)'
+        week2_path = str(tmp_path / 'report_week2.csv')
+        week2.to_csv(week2_path, index=False)
+        second, delta = run_both(processor, week2_path)
+
+        assert len(second.index) > len(first.index)
+        assert delta['unchanged'] == np.isin(second.index, first.index).sum()
+        assert delta['new'] == 0 and delta['closed'] == 0
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nexpose_schema
+import vulnerability_transforms
+
+
+def test_mixed_precision_in_one_column():
+    parser = nexpose_schema.DateParser()
+    values = ['2020-01-01 00:00:00'] * 10 + ['2024-05-01 10:00:12.123', '2024-05-02 08:30:00.5', '', 'not a date']
+    parsed = parser.parse('Vulnerability Test Date', pd.Series(values))
+
+    assert parsed.iloc[0] == pd.Timestamp('2020-01-01 00:00:00')
+    assert parsed.iloc[10] == pd.Timestamp('2024-05-01 10:00:12.123')
+    assert parsed.iloc[11] == pd.Timestamp('2024-05-02 08:30:00.5')
+    assert parsed.iloc[12:].isna().all()
+    assert parser.invalid_counts['Vulnerability Test Date'] == 1
+
+
+def test_mixed_precision_across_batches():
+    parser = nexpose_schema.DateParser()
+    first = parser.parse('Vulnerable Since', pd.Series(['2024-01-01 00:00:00', '2024-01-02 00:00:00']))
+    second = parser.parse('Vulnerable Since', pd.Series(['2024-01-03 00:00:00.250', '2024-01-04T05:06:07Z']))
+    third = nexpose_schema.DateParser()
+    third.parse('Vulnerable Since', pd.Series(['2024-01-03 00:00:00.250']))
+    fourth = third.parse('Vulnerable Since', pd.Series(['2020-01-01 00:00:00']))
+
+    assert first.notna().all() and second.notna().all() and fourth.notna().all()
+    assert second.iloc[0] == pd.Timestamp('2024-01-03 00:00:00.250')
+    assert second.iloc[1] == pd.Timestamp('2024-01-04 05:06:07')
+    assert parser.invalid_counts['Vulnerable Since'] == 0
+
+
+def test_stale_whole_second_dates_are_filtered():
+    recent = (pd.Timestamp.today() - pd.Timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S.%f')
+    data = pd.DataFrame({'Vulnerability Test Date': ['2020-01-01 00:00:00'] * 10 + [recent] * 190})
+    data['Vulnerability Test Date'] = nexpose_schema.DateParser().parse('Vulnerability Test Date', data['Vulnerability Test Date'])
+
+    assert vulnerability_transforms.stale_test_date_rows(data).sum() == 10
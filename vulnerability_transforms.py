@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+import key_encoding
+
+CVSS_SCORE_COLUMN = 'Vulnerability CVSS Score'
+CVSS_V3_SCORE_COLUMN = 'Vulnerability CVSSv3 Score'
+SEVERITY_COLUMN = 'Vulnerability CVSSv3 Severity'
+UNIQUE_ID_COLUMN = 'Unique Vulnerability ID'
+
+# Severity bands as (label, lower bound, upper bound), both bounds inclusive. The bands are kept exactly
+# as the original per-row score_to_severity, including the gaps between them (e.g. 3.95 or 6.95 get '').
+SEVERITY_BANDS = [
+    ('Low', 0.1, 3.9),
+    ('Medium', 4.0, 6.9),
+    ('High', 7.0, 8.9),
+    ('Critical', 9.0, 10.0),
+]
+FALSE_POSITIVE_TITLE = 'X.509 Certificate Subject CN Does Not Match the Entity Name'
+FALSE_POSITIVE_PORT = 17472
+
+
+def merged_severity_score(data):
+    """the CVSSv3 score where it is non-zero, otherwise the CVSS (v2) score"""
+    if CVSS_V3_SCORE_COLUMN not in data.columns:
+        return data[CVSS_SCORE_COLUMN]
+    # NOTE: Built using this strategy https://stackoverflow.com/questions/55498357/update-pandas-column-with-another-columns-values-using-loc
+    return pd.Series(np.where(data[CVSS_V3_SCORE_COLUMN].ne(0), data[CVSS_V3_SCORE_COLUMN], data[CVSS_SCORE_COLUMN]),
+                     index=data.index)
+
+
+def merge_severity_scores(data):
+    """use the CVSSv3 score where it is non-zero, otherwise keep the CVSS (v2) score; drops the v3 column"""
+    data[CVSS_SCORE_COLUMN] = merged_severity_score(data)
+    data.drop(CVSS_V3_SCORE_COLUMN, axis=1, inplace=True)
+    return data
+
+
+def false_positive_rows(data):
+    """certificate name mismatch findings on the agent port, or None when the columns are missing"""
+    if not {'Vulnerability Title', 'Service Port'}.issubset(data.columns):
+        return None
+    return ((data['Vulnerability Title'] == FALSE_POSITIVE_TITLE)
+            & (pd.to_numeric(data['Service Port'], errors='coerce') == FALSE_POSITIVE_PORT))
+
+
+def stale_test_date_rows(data, days=30):
+    """rows last tested more than `days` days ago (rows without a test date are kept)"""
+    target_date = datetime.today() - timedelta(days=days)
+    return data['Vulnerability Test Date'] < target_date
+
+
+def below_severity_rows(data, severity):
+    """rows whose merged severity score is below `severity` (rows without a score are kept)"""
+    return merged_severity_score(data) < severity
+
+
+class FilterPlan:
+    """
+    Collects row predicates and applies them in a single pass.
+
+    Every predicate returns a boolean Series of the rows to drop (or None to skip). The predicates are
+    all evaluated against the unfiltered frame, combined into one mask, and the surviving rows are
+    copied once, instead of building a new wide frame after every filter step.
+    """
+
+    def __init__(self):
+        self.predicates = []
+        self.dropped = {}
+
+    def exclude(self, name, predicate):
+        self.predicates.append((name, predicate))
+        return self
+
+    def apply(self, data):
+        drop = np.zeros(len(data.index), dtype=bool)
+        for name, predicate in self.predicates:
+            rows = predicate(data)
+            if rows is None:
+                continue
+            rows = rows.to_numpy(dtype=bool, na_value=False)
+            # Rows are counted against the first predicate that drops them.
+            self.dropped[name] = int((rows & ~drop).sum())
+            drop |= rows
+        if not drop.any():
+            return data
+        return data.take(np.flatnonzero(~drop))
+
+
+def score_to_severity(scores):
+    """map a Series of CVSS scores to severity labels (None/Low/Medium/High/Critical) in one pass"""
+    values = pd.to_numeric(scores, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    conditions = [values == 0] + [(values >= low) & (values <= high) for _, low, high in SEVERITY_BANDS]
+    labels = ['None'] + [label for label, _, _ in SEVERITY_BANDS]
+    return pd.Series(np.select(conditions, labels, default=''), index=scores.index, dtype=object)
+
+
+def add_severity_column(data, loc=6):
+    """insert the severity label column next to the asset columns"""
+    data.insert(loc=loc, column=SEVERITY_COLUMN, value=score_to_severity(data[CVSS_SCORE_COLUMN]))
+    return data
+
+
+def parse_age_days(age):
+    """parse 'Vulnerability Age' values such as '1,234 Days' into nullable integers"""
+    # Ages repeat a lot, so only the distinct values are parsed and the result is mapped back by code.
+    codes, uniques = pd.factorize(age)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object).astype(str).str.replace(r' Days?|,', '', regex=True),
+                           errors='coerce').astype('Int64')
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=age.index)
+
+
+def remediation_deadline(age, deadline_age_days):
+    """'<age - deadline_age_days> Days' label for every 'Vulnerability Age' value"""
+    return (parse_age_days(age) - deadline_age_days).astype(str) + ' Days'
+
+
+def add_unique_vulnerability_id(data):
+    """add the asset name + vulnerability ID key identifying a vulnerability instance on an asset"""
+    # Built on the integer codes of both columns; the label is only formatted once per distinct pair.
+    data[UNIQUE_ID_COLUMN] = key_encoding.encode_labels(data['Asset Names'], data['Vulnerability ID'])
+    return data